@@ -0,0 +1,287 @@
+// Clientside callbacks of the network graph.
+// The stylesheet builder mirrors sencodex/stylesheet.py : keep both in sync
+// (python -m sencodex.stylesheet checks that they build the same stylesheets).
+
+(function (root) {
+
+    // Colors
+
+    var NODE_COLOR = "#07ABA0";
+    var LABEL_COLOR = "#008B80";
+    var EDGE_COLOR = "#C5D3E2";
+    var HIGHLIGHT_COLOR = "#920000";
+    var CITED_COLOR = "#ffdf4d";
+    var CITING_COLOR = "#b66dff";
+    var QUERY_COLORS = {"ancestors": CITED_COLOR, "descendants": CITING_COLOR, "path": HIGHLIGHT_COLOR};
+
+    // Base stylesheet of the network graph
+
+    function baseFragment() {
+        return [
+            {
+                "selector": "node",
+                "style": {
+                    "opacity": 0.9,
+                    "label": "data(label)",
+                    "width": "data(node_size)",
+                    "height": "data(node_size)",
+                    "background-color": NODE_COLOR,
+                    "color": LABEL_COLOR
+                }
+            },
+            {
+                "selector": "edge",
+                "style": {
+                    "target-arrow-color": EDGE_COLOR,
+                    "target-arrow-shape": "triangle",
+                    "line-color": EDGE_COLOR,
+                    "background-color": NODE_COLOR,
+                    "arrow-scale": 2,
+                    "curve-style": "bezier"
+                }
+            }
+        ];
+    }
+
+    function nodeSelector(nodeIds) {
+        return nodeIds.map(function (nodeId) {
+            return 'node[id = "' + nodeId + '"]';
+        }).join(", ");
+    }
+
+    function sizeFragment(sizeRules) {
+        return (sizeRules || []).map(function (rule) {
+            return {
+                "selector": rule[0],
+                "style": {
+                    "width": rule[1],
+                    "height": rule[1]
+                }
+            };
+        });
+    }
+
+    function tappedFragment(nodeId) {
+        return [
+            {
+                "selector": nodeSelector([nodeId]),
+                "style": {
+                    "background-color": HIGHLIGHT_COLOR,
+                    "border-color": HIGHLIGHT_COLOR,
+                    "border-width": 2,
+                    "border-opacity": 1,
+                    "opacity": 1,
+                    "label": "data(label)",
+                    "color": HIGHLIGHT_COLOR,
+                    "text-opacity": 1,
+                    "font-size": 12
+                }
+            }
+        ];
+    }
+
+    function sectorFragment(sectorIds) {
+        return [
+            {
+                "selector": nodeSelector(sectorIds),
+                "style": {
+                    "background-color": HIGHLIGHT_COLOR
+                }
+            }
+        ];
+    }
+
+    function publicationFragment(publications) {
+        return [
+            {
+                "selector": nodeSelector(publications),
+                "style": {
+                    "background-color": HIGHLIGHT_COLOR,
+                    "border-color": HIGHLIGHT_COLOR,
+                    "border-width": 2,
+                    "border-opacity": 1,
+                    "opacity": 1,
+                    "width": "200px",
+                    "height": "200px",
+                    "label": "data(label)",
+                    "color": HIGHLIGHT_COLOR,
+                    "text-opacity": 1,
+                    "font-size": 12
+                }
+            }
+        ];
+    }
+
+    function neighborFragment(nodeId, citedIds, citingIds) {
+        var fragment = [];
+        if (citedIds.length) {
+            fragment.push({
+                "selector": nodeSelector(citedIds),
+                "style": {
+                    "background-color": CITED_COLOR,
+                    "opacity": 0.9
+                }
+            });
+            fragment.push({
+                "selector": 'edge[source = "' + nodeId + '"]',
+                "style": {
+                    "mid-target-arrow-color": CITED_COLOR,
+                    "mid-target-arrow-shape": "vee",
+                    "line-color": CITED_COLOR,
+                    "opacity": 0.9
+                }
+            });
+        }
+        if (citingIds.length) {
+            fragment.push({
+                "selector": nodeSelector(citingIds),
+                "style": {
+                    "background-color": CITING_COLOR,
+                    "opacity": 0.9
+                }
+            });
+            fragment.push({
+                "selector": 'edge[target = "' + nodeId + '"]',
+                "style": {
+                    "mid-target-arrow-color": CITING_COLOR,
+                    "mid-target-arrow-shape": "vee",
+                    "line-color": CITING_COLOR,
+                    "opacity": 1
+                }
+            });
+        }
+        return fragment;
+    }
+
+    function queryFragment(mode, nodeIds, edgeIds) {
+        var color = QUERY_COLORS[mode];
+        var fragment = [];
+        if (nodeIds.length) {
+            fragment.push({
+                "selector": nodeSelector(nodeIds),
+                "style": {
+                    "background-color": color,
+                    "opacity": 1
+                }
+            });
+        }
+        if (edgeIds.length) {
+            fragment.push({
+                "selector": edgeIds.map(function (edgeId) {
+                    return 'edge[id = "' + edgeId + '"]';
+                }).join(", "),
+                "style": {
+                    "mid-target-arrow-color": color,
+                    "mid-target-arrow-shape": "vee",
+                    "line-color": color,
+                    "width": 4,
+                    "opacity": 1
+                }
+            });
+        }
+        return fragment;
+    }
+
+    function sortedUnique(values) {
+        return Array.from(new Set(values)).sort();
+    }
+
+    function neighborsFromEdges(nodeId, edgesData) {
+        var citedIds = [];
+        var citingIds = [];
+        (edgesData || []).forEach(function (edge) {
+            if (edge.source === nodeId) {
+                citedIds.push(edge.target);
+            }
+            if (edge.target === nodeId) {
+                citingIds.push(edge.source);
+            }
+        });
+        return [sortedUnique(citedIds), sortedUnique(citingIds)];
+    }
+
+    function buildStylesheet(nodeId, citedIds, citingIds, sectorIds, publications, sizeRules, query) {
+        var stylesheet = baseFragment().concat(sizeFragment(sizeRules));
+        sectorIds = sectorIds || [];
+        publications = publications || [];
+        if (nodeId) {
+            stylesheet = stylesheet.concat(tappedFragment(nodeId));
+            if (sectorIds.length) {
+                stylesheet = stylesheet.concat(sectorFragment(sectorIds));
+            }
+            stylesheet = stylesheet.concat(neighborFragment(nodeId, citedIds || [], citingIds || []));
+        } else if (sectorIds.length) {
+            stylesheet = stylesheet.concat(sectorFragment(sectorIds));
+        } else if (publications.length) {
+            if (query) {
+                stylesheet = stylesheet.concat(queryFragment(query[0], query[1], query[2]));
+            }
+            stylesheet = stylesheet.concat(publicationFragment(publications));
+        }
+        return stylesheet;
+    }
+
+    // Url of the last element request of the range slider
+
+    var latestElementsUrl = null;
+
+    var api = {
+        buildStylesheet: buildStylesheet,
+        neighborsFromEdges: neighborsFromEdges
+    };
+
+    root.dash_clientside = Object.assign({}, root.dash_clientside, {
+        offcanvas: {
+            toggle: function (n1, isOpen) {
+                if (n1) {
+                    return !isOpen;
+                }
+                return isOpen;
+            }
+        },
+        stylesheet: {
+            // neighbours are read from the edges of the tapped node, already in the browser
+            // sectorIds come from the server (sencodex/membership.py), publications from the dropdown
+            generate: function (node, sectorIds, publications, sizeRules, query) {
+                if (publications && !Array.isArray(publications)) {
+                    publications = [publications];
+                }
+                if (node) {
+                    var nodeId = node.data.id;
+                    var neighbors = neighborsFromEdges(nodeId, node.edgesData);
+                    return buildStylesheet(nodeId, neighbors[0], neighbors[1], sectorIds, publications, sizeRules, query);
+                }
+                return buildStylesheet(null, [], [], sectorIds, publications, sizeRules, query);
+            }
+        },
+        elements: {
+            // whole element lists of the slider ranges, fetched pre-serialized and compressed
+            // (sencodex/payloads.py). A request superseded before its response arrives is
+            // dropped, the graph already follows a newer range
+            fetch: function (request) {
+                var noUpdate = root.dash_clientside.no_update;
+                latestElementsUrl = request ? request.url : null;
+                if (!request) {
+                    return [noUpdate, noUpdate];
+                }
+                return root.fetch(request.url).then(function (response) {
+                    if (!response.ok) {
+                        throw new Error("elements of " + request.url + " : " + response.status);
+                    }
+                    return response.json();
+                }).then(function (elements) {
+                    if (latestElementsUrl !== request.url) {
+                        return [noUpdate, noUpdate];
+                    }
+                    latestElementsUrl = null;
+                    return [elements, {"range": request.range, "cells": []}];
+                });
+            }
+        }
+    });
+
+    if (typeof module !== "undefined" && module.exports) {
+        module.exports = api;
+    }
+
+})(typeof window !== "undefined" ? window : globalThis);
@@ -0,0 +1,202 @@
+#Benchmarks of the Dash callbacks of front_end_app, called directly with realistic inputs :
+#every slider range, taps on the most cited publications, sector highlights, citation
+#queries and exports of several publications. For each callback, reports the latency
+#percentiles of the calls, of their JSON serialization by Dash, the memory allocated by
+#a call (peak, traced) and the size of the serialized output.
+#
+#    python -m benchmarks.callbacks
+#    python -m benchmarks.callbacks --repeat 20 --only update_output,func --json results.json
+#
+#Responses are cached (sencodex/cache.py) : the first call of each input is reported apart,
+#and SEN_CODEX_CACHE_MB=0 keeps the caches from serving the repeated calls.
+
+import argparse
+from collections import OrderedDict
+import json
+import time
+import tracemalloc
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+import front_end_app as app
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.data import get_adjacency, get_graph_index, preload
+
+HUBS = 20
+
+
+def ranges():
+    return [[start, end] for start in range(FIRST_YEAR, LAST_YEAR + 1) for end in range(start, LAST_YEAR + 1)]
+
+
+def graph_state(start, end):
+    return {'range': [start, end], 'cells': []}
+
+
+def hubs(count=HUBS):
+    # node data of the most cited publications of the graph, with the data of their edges as
+    # the browser sends them (selectedEdgeData, tapNode edgesData)
+    graph_index = get_graph_index()
+    adjacency = get_adjacency()
+    degrees = np.diff(adjacency.in_indptr) + np.diff(adjacency.out_indptr)
+    nodes = []
+    for code in np.argsort(-degrees, kind='stable'):
+        publication_id = adjacency.ids[code]
+        element = graph_index.get(publication_id)
+        if element is None or len(element['data']) <= 3:
+            continue
+        edges = [graph_index.get((publication_id, neighbor))
+                 for neighbor in adjacency.out_neighbors(publication_id)]
+        edges += [graph_index.get((neighbor, publication_id))
+                  for neighbor in adjacency.in_neighbors(publication_id)]
+        nodes.append((element['data'], [edge['data'] for edge in edges if edge is not None]))
+        if len(nodes) == count:
+            break
+    return nodes
+
+
+def dropdown_values(component_id):
+    # values of a dropdown of the page layout
+    for component in app.serve_layout()._traverse():
+        if getattr(component, 'id', None) == component_id:
+            return [option['value'] for option in component.options]
+    raise KeyError(component_id)
+
+
+def callback_cases():
+    # callback name -> (function, list of argument tuples)
+    full = [FIRST_YEAR, LAST_YEAR]
+    hub_nodes = hubs()
+    hub_ids = [data['id'] for data, _ in hub_nodes]
+    sector_names = dropdown_values('sectors_dropdown')
+    type_docs = dropdown_values('type_doc_dropdown')
+    highlights = [app.update_sector_highlight([sector], [], full) for sector in sector_names[:10]]
+    return OrderedDict([
+        # from the whole graph to every range, and one year wider (sent as a diff)
+        ('update_output', (app.update_output,
+                           [(value, graph_state(*full)) for value in ranges()]
+                           + [([start, min(end + 1, LAST_YEAR)], graph_state(start, end)) for start, end in ranges()])),
+        ('update_output_fetched', (app.update_output_fetched,
+                                   [(value, graph_state(*full)) for value in ranges()])),
+        ('generate_stylesheet', (app.generate_stylesheet,
+                                 [({'data': data, 'edgesData': edges}, [], None, [], None) for data, edges in hub_nodes]
+                                 + [(None, highlight, None, [], None) for highlight in highlights]
+                                 + [(None, [], hub_ids[:count], [], None) for count in (1, 5, 20)]
+                                 + [(None, [], hub_ids[:1], [], ['ancestors', hub_ids, []])])),
+        ('update_sector_highlight', (app.update_sector_highlight,
+                                     [([sector], [], value) for sector in sector_names[:10] for value in (full, [15, 18])]
+                                     + [(sector_names[:3], type_docs[:1], full)])),
+        ('display_sector_citations', (app.display_sector_citations,
+                                      [([sector], [], value) for sector in sector_names[:10] for value in (full, [15, 18])]
+                                      + [(sector_names[:3], type_docs[:1], full)])),
+        ('display_nodedata', (app.display_nodedata,
+                              [([data], None, full) for data, _ in hub_nodes]
+                              + [(None, edges[:1], full) for _, edges in hub_nodes if edges]
+                              + [([data for data, _ in hub_nodes], None, full)])),
+        ('run_query', (app.run_query,
+                       [(hub_ids[:1], mode, hops, None) for mode in ('ancestors', 'descendants') for hops in (1, 2, 6)]
+                       + [(hub_ids[:1], 'path', 1, target) for target in hub_ids[1:6]])),
+        ('search_options', (app.search_options,
+                            [(query, None) for query in ('21', '21-D', 'concurrence', 'distribution sel', 'énergie')])),
+        ('update_size_rules', (app.update_size_rules,
+                               [(metric, value) for metric in ('pagerank', 'in_degree', 'received')
+                                for value in (full, [12, 15])])),
+        ('func', (app.func,
+                  [(1, [data for data, _ in hub_nodes[:count]], mode) for count in (1, 5, 20)
+                   for mode in ('merged', 'sheets')])),
+    ])
+
+
+def percentiles(values):
+    # in milliseconds
+    values = np.asarray(values) * 1000
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+def benchmark(function, cases, repeat):
+    # the first call of each case, then repeat rounds over every case
+    first = []
+    outputs = []
+    for args in cases:
+        started = time.perf_counter()
+        outputs.append(function(*args))
+        first.append(time.perf_counter() - started)
+    latencies = []
+    for _ in range(repeat):
+        for args in cases:
+            started = time.perf_counter()
+            function(*args)
+            latencies.append(time.perf_counter() - started)
+
+    serialization = []
+    sizes = []
+    for output in outputs:
+        started = time.perf_counter()
+        sizes.append(len(to_json_plotly(output)))
+        serialization.append(time.perf_counter() - started)
+
+    # traced apart, tracemalloc slows the calls down
+    peaks = []
+    tracemalloc.start()
+    try:
+        for args in cases:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            function(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'cases': len(cases),
+        'first': percentiles(first),
+        'calls': percentiles(latencies or first),
+        'serialization': percentiles(serialization),
+        'peak_kib': {'p50': float(np.median(peaks)) / 1024, 'max': max(peaks) / 1024},
+        'payload_kib': {'p50': float(np.median(sizes)) / 1024, 'max': max(sizes) / 1024},
+    }
+
+
+def report(results):
+    print(f"{'callback':<24}{'cases':>6}{'first p50':>11}{'p50':>9}{'p90':>9}{'p99':>9}{'json p50':>10}"
+          f"{'peak KiB':>10}{'payload KiB':>13}")
+    for name, result in results.items():
+        calls = result['calls']
+        print(f"{name:<24}{result['cases']:>6}{result['first']['p50']:>11.2f}{calls['p50']:>9.2f}{calls['p90']:>9.2f}"
+              f"{calls['p99']:>9.2f}{result['serialization']['p50']:>10.2f}{result['peak_kib']['max']:>10.0f}"
+              f"{result['payload_kib']['max']:>13.1f}")
+    print("latencies in ms, peak allocation and payload : largest over the cases")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Dash callbacks of front_end_app")
+    parser.add_argument('--repeat', type=int, default=5, help="rounds over every case after the first calls")
+    parser.add_argument('--only', help="comma separated callback names")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    preload()
+    cases = callback_cases()
+    if args.only:
+        names = args.only.split(',')
+        unknown = set(names) - set(cases)
+        if unknown:
+            parser.error(f"unknown callbacks {', '.join(sorted(unknown))}, expected some of {', '.join(cases)}")
+        cases = OrderedDict((name, cases[name]) for name in names)
+
+    results = OrderedDict((name, benchmark(function, arguments, args.repeat))
+                          for name, (function, arguments) in cases.items())
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
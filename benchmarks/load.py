@@ -0,0 +1,168 @@
+#Load driver : replays recorded interaction traces against the Flask server of the app, by a
+#number of concurrent users, and reports the latency percentiles, errors and bytes received
+#of each kind of request, and the throughput.
+#
+#    python -m benchmarks.load benchmarks/traces/explore.json --users 8 --duration 30
+#    python -m benchmarks.load session.har --url http://localhost:8050 --users 16 --iterations 5
+#
+#A trace is a JSON list of requests {"method", "path", "json"}, or a HAR file saved from the
+#network tab of the browser developer tools, of which the requests to the app are kept. Without
+#--url, the requests go to the app in-process, through one Flask test client per user.
+
+import argparse
+from collections import defaultdict
+import json
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+import urllib.request
+
+import numpy as np
+
+HEADERS = {'Accept-Encoding': 'gzip, br', 'Content-Type': 'application/json'}
+
+
+def request_label(step):
+    # Dash callbacks by their outputs, other requests by their path
+    body = step.get('json') or {}
+    if 'output' in body:
+        return f"callback {body['output']}"
+    return f"{step['method']} {urlsplit(step['path']).path}"
+
+
+def read_har(har):
+    steps = []
+    for entry in har['log']['entries']:
+        request = entry['request']
+        url = urlsplit(request['url'])
+        step = {'method': request['method'], 'path': url.path + (f"?{url.query}" if url.query else '')}
+        text = (request.get('postData') or {}).get('text')
+        if text:
+            step['json'] = json.loads(text)
+        steps.append(step)
+    return steps
+
+
+def read_trace(path):
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+    steps = read_har(trace) if isinstance(trace, dict) and 'log' in trace else trace
+    # the requests of the app only, without the external stylesheets and fonts
+    return [step for step in steps if not step['path'].startswith(('http:', 'https:'))]
+
+
+class TestClientSession:
+    # requests to the app in-process
+
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def send(self, step):
+        response = self.client.open(step['path'], method=step['method'], json=step.get('json'), headers=HEADERS)
+        return response.status_code, len(response.data)
+
+
+class HTTPSession:
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def send(self, step):
+        data = json.dumps(step['json']).encode('utf-8') if 'json' in step else None
+        request = urllib.request.Request(self.url + step['path'], data=data, method=step['method'], headers=HEADERS)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, len(response.read())
+        except HTTPError as error:
+            return error.code, len(error.read())
+
+
+def run_user(session, steps, offset, deadline, iterations, think, results, lock):
+    # the trace from offset, in a loop, until the deadline or the number of iterations
+    latencies = defaultdict(list)
+    received = defaultdict(int)
+    errors = defaultdict(int)
+    count = 0
+    while time.perf_counter() < deadline and (iterations is None or count < iterations * len(steps)):
+        step = steps[(offset + count) % len(steps)]
+        label = request_label(step)
+        started = time.perf_counter()
+        try:
+            status, size = session.send(step)
+        except OSError:
+            status, size = None, 0
+        latencies[label].append(time.perf_counter() - started)
+        received[label] += size
+        if status is None or status >= 400:
+            errors[label] += 1
+        count += 1
+        if think:
+            time.sleep(think)
+    with lock:
+        for label, values in latencies.items():
+            results['latencies'][label].extend(values)
+            results['received'][label] += received[label]
+            results['errors'][label] += errors[label]
+
+
+def run(steps, make_session, users, duration, iterations, think):
+    results = {'latencies': defaultdict(list), 'received': defaultdict(int), 'errors': defaultdict(int)}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+    # each user starts at another point of the trace
+    threads = [
+        threading.Thread(target=run_user, args=(
+            make_session(), steps, user * len(steps) // users, deadline, iterations, think, results, lock))
+        for user in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results['elapsed'] = time.perf_counter() - started
+    return results
+
+
+def report(results, users):
+    latencies = results['latencies']
+    total = sum(len(values) for values in latencies.values())
+    print(f"{'request':<72}{'count':>7}{'errors':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'KiB/req':>9}")
+    for label in sorted(latencies, key=lambda label: -np.sum(latencies[label])):
+        values = np.asarray(latencies[label]) * 1000
+        print(f"{label[:71]:<72}{len(values):>7}{results['errors'][label]:>7}{np.percentile(values, 50):>9.1f}"
+              f"{np.percentile(values, 90):>9.1f}{np.percentile(values, 99):>9.1f}"
+              f"{results['received'][label] / len(values) / 1024:>9.1f}")
+    print(f"{total} requests by {users} users in {results['elapsed']:.1f} s : {total / results['elapsed']:.1f} requests/s, "
+          f"latencies in ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay interaction traces against the app")
+    parser.add_argument('trace', help="JSON list of requests, or HAR file")
+    parser.add_argument('--url', help="base url of a running app, the app is loaded in-process otherwise")
+    parser.add_argument('--users', type=int, default=4, help="concurrent users")
+    parser.add_argument('--duration', type=float, default=30, help="seconds, at most")
+    parser.add_argument('--iterations', type=int, help="replays of the trace per user, no limit by default")
+    parser.add_argument('--think', type=float, default=0, help="pause between the requests of a user, in seconds")
+    args = parser.parse_args()
+
+    steps = read_trace(args.trace)
+    if not steps:
+        parser.error(f"no request of the app in {args.trace}")
+    if args.url:
+        def make_session():
+            return HTTPSession(args.url)
+    else:
+        from front_end_app import server
+
+        def make_session():
+            return TestClientSession(server)
+
+    results = run(steps, make_session, args.users, args.duration, args.iterations, args.think)
+    report(results, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,57 @@
 #Import packages
 
+import time
+
+import_started = time.perf_counter()
+
 from datetime import datetime
-import blosc
-from dash import Dash, dcc, html, Input, Output, State
+import io
+import logging
+import os
+from urllib.parse import urlencode
+from dash import ClientsideFunction, Dash, dcc, html, no_update, Input, Output, State
 import dash_bootstrap_components as dbc
 import dash_cytoscape as cyto
-import pandas as pd
-import pickle
 
-#Import network raw data
+from sencodex import FIRST_YEAR, LAST_YEAR, slider_year
+from sencodex.analytics import size_rules
+from sencodex.cache import JSON
+from sencodex.compression import register_compression
+from sencodex.diffs import selection_patch
+from sencodex.exports import register_export_routes
+from sencodex.metrics import ENABLED as METRICS, instrument_callbacks, phase, register_metrics
+from sencodex.payloads import elements_url, register_payload_routes
+from sencodex.graph_store import edge_id
+from sencodex.queries import ANCESTORS, DESCENDANTS, PATH, path_edges
+from sencodex.stylesheet import EDGE_COLOR, NODE_COLOR, build_stylesheet, neighbors_from_edges, query_key
+from sencodex.data import (
+    get_adjacency, get_cache, get_citation_analytics, get_citation_index, get_citation_queries, get_graph_index,
+    get_level_of_detail, get_membership, get_range_metrics, get_range_node_mask, get_range_responses, get_search_index,
+    get_temporal_citations, preload, report_startup, timed, timings
+)
+
+#Startup mode : data is loaded at import by default, or on first use with SEN_CODEX_LAZY=1.
+#The time spent in each phase is logged and compared to SEN_CODEX_STARTUP_BUDGET_MS.
+
+logging.basicConfig(level=logging.INFO)
+
+LAZY_STARTUP = os.environ.get('SEN_CODEX_LAZY') == '1'
+
+#Toggle and highlight callbacks run in the browser, set SEN_CODEX_CLIENTSIDE=0 to run them on the server
+
+CLIENTSIDE_CALLBACKS = os.environ.get('SEN_CODEX_CLIENTSIDE', '1') != '0'
 
-with open(f"static/elements_m1.dat", "rb") as f:
-    compressed_pickle = f.read()
+#Level of detail : with SEN_CODEX_LOD=1, minor publications are only sent once zoomed in past SEN_CODEX_LOD_ZOOM
 
-    depressed_pickle = blosc.decompress(compressed_pickle)
-    # turn bytes object back into data
-    elements = pickle.loads(depressed_pickle)
+LEVEL_OF_DETAIL = os.environ.get('SEN_CODEX_LOD') == '1'
 
-df_export = pd.read_csv('static/export_graph_1309.csv', index_col=False, sep=',', engine='python')
+#Responses of at least SEN_CODEX_COMPRESS_MIN_BYTES are compressed, unless SEN_CODEX_COMPRESS=0
+
+COMPRESSION = os.environ.get('SEN_CODEX_COMPRESS', '1') != '0'
+COMPRESS_MIN_BYTES = int(os.environ.get('SEN_CODEX_COMPRESS_MIN_BYTES', 1024))
+STARTUP_BUDGET_MS = float(os.environ.get('SEN_CODEX_STARTUP_BUDGET_MS', 2000))
+
+timings['imports'] = time.perf_counter() - import_started
 
 #Setting Dash app
 
@@ -25,6 +59,14 @@ app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = 'SEN-CodeX'
 
 server = app.server
+register_export_routes(server)
+register_payload_routes(server)
+#Instrumentation : with SEN_CODEX_METRICS=1, callbacks are timed and metrics served on /metrics (sencodex/metrics.py)
+if METRICS:
+    instrument_callbacks(app)
+    register_metrics(server, app)
+if COMPRESSION:
+    register_compression(server, min_size=COMPRESS_MIN_BYTES)
 app.scripts.config.serve_locally = True
 app.css.config.serve_locally = True
 
@@ -126,99 +168,177 @@ sector_dropdown = dbc.Row(
                 {'label': 'Transport', 'value': 'Transports'},
                 {'label': "Life of the institution", 'value': 'institution'},
             ],
-            persistence=True
-            # multi=True,
+            persistence=True,
+            multi=True,
+        ),
+        width=10,
+        ),
+        dbc.Col(
+        dcc.Dropdown(
+            id="type_doc_dropdown",
+            options=[
+                {'label': 'Decisions', 'value': 'Décision'},
+                {'label': 'Opinions', 'value': 'Avis'},
+            ],
+            placeholder="All document types",
+            persistence=True,
+            multi=True,
         ),
         width=10,
         ),
+        html.Small(id="sector-data"),
     ],
     className="mb-3",
 )
 
-#Filter 3 : node input
+#Filter 2 bis : node sizes
 
-node_dropdown = dbc.Row(
+size_dropdown = dbc.Row(
     [
-        dbc.Label("Highlight publication(s) by its number (i.e. 09-D-06, 20-A-08, etc…) Only decisions, opinions and interim measures are available."),
+        dbc.Label("Size the publications by their influence over the period"),
         dbc.Col(
-        dcc.Dropdown(df_export['Publication A'].unique(), id="dropdown_node"),
-        width=10
+        dcc.Dropdown(
+            id="size_dropdown",
+            options=[
+                {'label': 'Page views', 'value': 'node_size'},
+                {'label': 'Number of publications quoting it', 'value': 'in_degree'},
+                {'label': 'Number of citations received', 'value': 'weighted_in'},
+                {'label': 'Citations received from publications of the period', 'value': 'received'},
+                {'label': 'PageRank', 'value': 'pagerank'},
+                {'label': 'Authority (HITS)', 'value': 'authority'},
+            ],
+            value='node_size',
+            clearable=False,
+            persistence=True
+        ),
+        width=10,
         ),
     ],
     className="mb-3",
 )
 
-#Filter 4 : offcanvas research dropdown
+#Filter 3 : node input, and the citation queries starting from the selected publication
 
-offcanvas_research= html.Div(
-    [
-        dbc.Offcanvas(
-            dbc.Form([node_dropdown, sector_dropdown, range_slider]),
-            id='offcanvas-recherche',
-            title='Explore the complex network',
-            is_open=False,
-            keyboard=True,
-            style={'width': '60vh', 'margin-top':'55px', 'background-color':'white'}
-        )
-    ]
-)
+#Last mark of the hops slider : no limit
 
-#Default stylesheet of the network graph
+ALL_HOPS = 6
 
-default_stylesheet = [
-    {
-        "selector": 'node', 
-        'style': {
-            "opacity": 0.9,
-            "label": "data(label)",
-            "width": "data(node_size)",
-            "height": "data(node_size)",
-            "background-color": "#07ABA0",
-            "color": "#008B80" 
-        }
-    },
-    {
-        "selector": 'edge',
-        "style": {
-            "target-arrow-color": "#C5D3E2",
-            "target-arrow-shape": "triangle",
-            "line-color": "#C5D3E2",
-            "background-color": "#07ABA0",
-            'arrow-scale': 2,
-            'curve-style': 'bezier'
-        },
-    },
-]
+def node_dropdown():
+    return dbc.Row(
+        [
+            dbc.Label("Highlight publication(s) by its number (i.e. 09-D-06, 20-A-08, etc…), title or sector. Only decisions, opinions and interim measures are available."),
+            dbc.Col(
+            dcc.Dropdown([], id="dropdown_node", multi=True, placeholder="Type a number, words of the title or a sector"),
+            width=10
+            ),
+            dbc.Col(
+            dbc.RadioItems(
+                id="query-mode",
+                options=[
+                    {'label': 'Publication only', 'value': 'publication'},
+                    {'label': 'Publications it relies on', 'value': ANCESTORS},
+                    {'label': 'Publications relying on it', 'value': DESCENDANTS},
+                    {'label': 'Citation path to', 'value': PATH},
+                ],
+                value='publication',
+            ),
+            width=10
+            ),
+            dbc.Col(
+            dcc.Slider(1, ALL_HOPS, 1, value=2, id="query-hops",
+                       marks={**{hops: f'{hops} hop(s)' for hops in range(1, ALL_HOPS)}, ALL_HOPS: 'all'}),
+            width=10
+            ),
+            dbc.Col(
+            dcc.Dropdown([], id="path-target", placeholder="Path target"),
+            width=10
+            ),
+            html.Small(id="query-data"),
+        ],
+        className="mb-3",
+    )
 
-# Setting the main app layout : describes what the app looks like and is a hierarchical tree of components
-
-app.layout = html.Div([
-    navbar,
-    offcanvas_research,
-    cyto.Cytoscape(
-        id='cytoscape-layout',
-        elements=elements,
-        style={'width': '100vw', 'height': '74.5vh'},
-        layout={
-            'name': 'preset',
-            'animate': True,
-            'animationDuration': 2000,
-        },
-        stylesheet=default_stylesheet,
-        minZoom=0.10,
-        maxZoom=1
-    ),
-    dbc.Row(
+#Filter 4 : offcanvas research dropdown
+
+def offcanvas_research():
+    return html.Div(
         [
-            dbc.Alert(
-                id="elements-data",
-                children="Click on a node or edge to see its details here",
-                color="secondary",
-                style={"width": "100vw",'height': '19.5vh', "margin-bottom": "0px", "margin-left": "10px"}
+            dbc.Offcanvas(
+                dbc.Form([node_dropdown(), sector_dropdown, size_dropdown, range_slider]),
+                id='offcanvas-recherche',
+                title='Explore the complex network',
+                is_open=False,
+                keyboard=True,
+                style={'width': '60vh', 'margin-top':'55px', 'background-color':'white'}
             )
         ]
-    ),
-], style={"height": "96vh", "width": "99.3vw"})
+    )
+
+#Default stylesheet of the network graph
+
+default_stylesheet = build_stylesheet()
+
+# Setting the main app layout : describes what the app looks like and is a hierarchical tree of components.
+# It is built on each page load. Dash validates the callbacks against app.validation_layout, the same
+# components without elements, instead of calling serve_layout when it is assigned, so that nothing is
+# read from disk at import in lazy mode.
+
+def initial_elements():
+    if LEVEL_OF_DETAIL:
+        return get_level_of_detail().overview(FIRST_YEAR, LAST_YEAR)
+    return get_range_responses().elements(FIRST_YEAR, LAST_YEAR)
+
+
+def page_layout(elements):
+    return html.Div([
+        navbar,
+        offcanvas_research(),
+        dcc.Store(id='graph-state', data={'range': [FIRST_YEAR, LAST_YEAR], 'cells': []}),
+        dcc.Store(id='elements-request', data=None),
+        dcc.Store(id='size-rules', data=[]),
+        dcc.Store(id='query-result', data=None),
+        dcc.Store(id='sector-highlight', data=[]),
+        cyto.Cytoscape(
+            id='cytoscape-layout',
+            elements=elements,
+            style={'width': '100vw', 'height': '74.5vh'},
+            layout={
+                'name': 'preset',
+                'animate': True,
+                'animationDuration': 2000,
+            },
+            stylesheet=default_stylesheet,
+            minZoom=0.10,
+            maxZoom=1,
+            boxSelectionEnabled=True
+        ),
+        dbc.Row(
+            [
+                dbc.Alert(
+                    id="elements-data",
+                    children="Click on a node or edge to see its details here",
+                    color="secondary",
+                    style={"width": "100vw",'height': '19.5vh', "margin-bottom": "0px", "margin-left": "10px"}
+                )
+            ]
+        ),
+        html.Small(id="viewport-data", style={"margin-left": "10px"}),
+    ], style={"height": "96vh", "width": "99.3vw"})
+
+
+def serve_layout():
+    return page_layout(initial_elements())
+
+
+app.validation_layout = page_layout([])
+app.layout = serve_layout
+
+if not LAZY_STARTUP:
+    preload()
+    # the elements of the first page load, from the range responses just loaded
+    with timed('layout'):
+        serve_layout()
+report_startup(STARTUP_BUDGET_MS)
 
 
 # Callback decorators : allow to update / create user interaction
@@ -226,28 +346,60 @@ app.layout = html.Div([
 
 # Callback 1 : Open main offcanvas when clicking "Filters" button
 
-@app.callback(
-    Output("offcanvas-recherche", "is_open"),
-    Input("open-offcanvas-recherche", "n_clicks"),
-    [State("offcanvas-recherche", "is_open")]
-)
 def toogle_offcanvas(n1, is_open):
     if n1:
         return not is_open
     return is_open
 
+
+toggle_dependencies = [
+    Output("offcanvas-recherche", "is_open"),
+    Input("open-offcanvas-recherche", "n_clicks"),
+    [State("offcanvas-recherche", "is_open")]
+]
+if CLIENTSIDE_CALLBACKS:
+    app.clientside_callback(ClientsideFunction(namespace='offcanvas', function_name='toggle'), *toggle_dependencies)
+else:
+    app.callback(*toggle_dependencies)(toogle_offcanvas)
+
 # Callback 2 : Main interaction when clicking on a node or edge
 
+def citation_sparkline(publication_id, value):
+    # citations received each year (sencodex/temporal.py), the years of the slider range highlighted
+    years, citations = get_temporal_citations().series(
+        publication_id, slider_year(FIRST_YEAR), slider_year(LAST_YEAR))
+    start, end = slider_year(value[0]), slider_year(value[1])
+    colors = [NODE_COLOR if start <= year <= end else EDGE_COLOR for year in years]
+    figure = {
+        'data': [{
+            'type': 'bar', 'x': years.tolist(), 'y': citations.tolist(), 'marker': {'color': colors},
+            'hovertemplate': '%{x} : %{y} citation(s)<extra></extra>',
+        }],
+        'layout': {
+            'height': 90, 'margin': {'l': 0, 'r': 0, 't': 18, 'b': 18},
+            'title': {'text': 'Citations received per year', 'font': {'size': 11}},
+            'xaxis': {'dtick': 2, 'fixedrange': True, 'tickfont': {'size': 9}},
+            'yaxis': {'visible': False, 'fixedrange': True},
+            'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)',
+        },
+    }
+    return dcc.Graph(figure=figure, config={'displayModeBar': False}, style={'height': '90px'})
+
+
 @app.callback(
     Output("elements-data",
            "children"),
     [Input("cytoscape-layout", "selectedNodeData"),
      Input('cytoscape-layout', 'selectedEdgeData')],
+    [State('my-range-slider', 'value')],
 )
-def display_nodedata(node_attr, edge_attr):
+def display_nodedata(node_attr, edge_attr, value):
     contents = "Click on a node or an edge to see its details here"
     if node_attr:
         contents = []
+        if len(node_attr) > 1:
+            # box selection : the download covers every selected publication
+            contents.append(html.H6(f"{len(node_attr)} publications selected, details of the last one :"))
         data = node_attr[-1]
         if len(data) > 3:
             contents.append(html.A(f'{data["id"] + " : " + data["type_doc"].title() + " " + data["titre"]}', href=f'https://www.autoritedelaconcurrence.fr/fr/liste-des-decisions-et-avis?search_api_fulltext={data["id"]}&sort_by=search_api_relevance&created%5Bmin%5D=&created%5Bmax%5D=', target="_blank"))
@@ -266,11 +418,39 @@ def display_nodedata(node_attr, edge_attr):
                                         "%Y-%m-%dT%H:%M:%SZ").strftime('%d/%m/%Y')
                 )
             )
+            contents.append(
+                html.P(
+                    "Quotes "
+                    + str(len(get_adjacency().out_neighbors(data["id"])))
+                    + " publication(s), quoted by "
+                    + str(len(get_adjacency().in_neighbors(data["id"])))
+                    + " publication(s)"
+                )
+            )
+            contents.append(citation_sparkline(data["id"], value))
+            metrics = get_citation_analytics().node_metrics(get_range_metrics(*value), data["id"])
+            if metrics:
+                contents.append(
+                    html.P(
+                        f"Between 20{value[0]:02d} and 20{value[1]:02d} : quoted by {metrics['in_degree']:.0f} "
+                        f"publication(s) ({metrics['weighted_in']:.0f} citation(s)), quotes {metrics['out_degree']:.0f}, "
+                        f"PageRank rank {metrics['pagerank_rank']} / {metrics['nodes']}"
+                    )
+                )
             contents.append(
                 html.P(
                     [
                     dbc.Button("Download data", id="btn_xlsx", color="primary", size="sm"),
-                    dcc.Download(id="download-dataframe-xlsx")
+                    dcc.Download(id="download-dataframe-xlsx"),
+                    dbc.RadioItems(
+                        id="export-mode",
+                        options=[
+                            {'label': 'One sheet per selected publication', 'value': 'sheets'},
+                            {'label': 'All selected publications in one sheet', 'value': 'merged'},
+                        ],
+                        value='sheets',
+                        inline=True,
+                    ),
                     ]
                 )
             )
@@ -300,305 +480,279 @@ def display_nodedata(node_attr, edge_attr):
 
 # Callback 3 : Update the network graph when range slider (years) changes
 
-@ app.callback(
-    Output('cytoscape-layout', 'elements'),
-    [Input('my-range-slider', 'value')],
-    [State('cytoscape-layout', 'elements')])
-def update_output(value, existing_state):
-    new_elements = []
-    if value[0] == 9 and value[1] == 21:
-        return existing_state
-    elif value[0] == 21 and value[1] == 21:
-        with open(f"static/elements_m1_21.dat", "rb") as f:
-            compressed_pickle = f.read()
-
-            depressed_pickle = blosc.decompress(compressed_pickle)
-            # turn bytes object back into data
-            elements = pickle.loads(depressed_pickle)
-            new_elements.extend(elements)
-        return new_elements
-    elif value[0] == 9 and value[1] == 9:
-        with open(f"static/elements_m1_9.dat", "rb") as f:
-            compressed_pickle = f.read()
-            depressed_pickle = blosc.decompress(compressed_pickle)
-            # turn bytes object back into data
-            elements = pickle.loads(depressed_pickle)
-            new_elements.extend(elements)
-        return new_elements
+# The elements shown in the browser are known from 'graph-state' (range and loaded cells of the
+# level of detail), so only the difference with the new selection is sent (sencodex/diffs.py)
+
+def range_patch(previous, start, end):
+    graph_index = get_graph_index()
+    with phase('range patch'):
+        return selection_patch(
+            graph_index.elements, graph_index.range_selection(*previous), graph_index.range_selection(start, end)
+        )
+
+
+def update_output(value, graph_state):
+    start, end = value
+    if graph_state['range'] == [start, end]:
+        return no_update, no_update
+    elements = range_patch(graph_state['range'], start, end)
+    if elements is None:
+        elements = get_range_responses().elements(start, end)
+    return elements, {'range': [start, end], 'cells': []}
+
+
+# With the clientside callbacks, whole element lists are not sent through the callback but fetched
+# by the browser, pre-serialized and compressed (sencodex/payloads.py), which then updates graph-state
+
+def update_output_fetched(value, graph_state):
+    start, end = value
+    if graph_state['range'] == [start, end]:
+        # also drops a pending request of another range
+        return no_update, no_update, None
+    elements = range_patch(graph_state['range'], start, end)
+    if elements is None:
+        return no_update, no_update, {'url': elements_url(start, end), 'range': [start, end]}
+    return elements, {'range': [start, end], 'cells': []}, None
+
+
+# With the level of detail, the graph also follows the viewport : the cells of the spatial grid
+# entering the viewport are loaded once zoomed in, and dropped when zooming out
+
+def update_output_lod(value, extent, zoom, graph_state):
+    level_of_detail = get_level_of_detail()
+    start, end = value
+    range_changed = graph_state['range'] != [start, end]
+    if not level_of_detail.zoomed_in(zoom) or extent is None:
+        cells = []
     else:
-        for i in range(value[0], value[1]+1):
-            with open(f"static/elements_m1_{i}.dat", "rb") as f:
-                compressed_pickle = f.read()
-
-                depressed_pickle = blosc.decompress(compressed_pickle)
-                # turn bytes object back into data
-                elements = pickle.loads(depressed_pickle)
-                new_elements.extend(elements)
-            new_elements = [i for n, i in enumerate(
-                new_elements) if i not in new_elements[n + 1:]]
-        return new_elements
+        cells = set(int(cell) for cell in level_of_detail.cells(extent))
+        if not range_changed:
+            cells.update(graph_state['cells'])
+        cells = sorted(cells)
+    if not range_changed and cells == graph_state['cells']:
+        return no_update, no_update
+
+    previous = level_of_detail.overview_selection(*graph_state['range'], graph_state['cells'])
+    selection = level_of_detail.overview_selection(start, end, cells)
+    elements = selection_patch(get_graph_index().elements, previous, selection)
+    if elements is None:
+        elements = level_of_detail.overview(start, end, cells)
+    return elements, {'range': [start, end], 'cells': cells}
+
+
+if LEVEL_OF_DETAIL:
+    app.callback(
+        [Output('cytoscape-layout', 'elements'), Output('graph-state', 'data')],
+        [Input('my-range-slider', 'value'), Input('cytoscape-layout', 'extent'), Input('cytoscape-layout', 'zoom')],
+        [State('graph-state', 'data')])(update_output_lod)
+elif CLIENTSIDE_CALLBACKS:
+    app.callback(
+        [Output('cytoscape-layout', 'elements'), Output('graph-state', 'data'), Output('elements-request', 'data')],
+        [Input('my-range-slider', 'value')],
+        [State('graph-state', 'data')])(update_output_fetched)
+    app.clientside_callback(
+        ClientsideFunction(namespace='elements', function_name='fetch'),
+        [Output('cytoscape-layout', 'elements', allow_duplicate=True), Output('graph-state', 'data', allow_duplicate=True)],
+        Input('elements-request', 'data'),
+        prevent_initial_call=True)
+else:
+    app.callback(
+        [Output('cytoscape-layout', 'elements'), Output('graph-state', 'data')],
+        [Input('my-range-slider', 'value')],
+        [State('graph-state', 'data')])(update_output)
 
 # Callback 4 : Update network graph when filters are activated
 
-@app.callback(Output('cytoscape-layout', 'stylesheet'),
-              [Input('cytoscape-layout', 'tapNode'), Input(component_id='sectors_dropdown', component_property='value'),
-              Input(component_id='dropdown_node', component_property='value')])
-def generate_stylesheet(node, sector, input):
-    if not node and not sector and not input:
-        return default_stylesheet
-    elif node and not sector:
-        stylesheet = [
-            {
-                "selector": 'node',
-                'style': {
-                    "opacity": 0.9,
-                    "label": "data(label)", 
-                    "width": "data(node_size)",
-                    "height": "data(node_size)",
-                    "background-color": "#07ABA0",
-                    "color": "#008B80"  
-                }
-            },
-            {
-                "selector": 'edge', 
-                "style": {
-                    "target-arrow-color": "#C5D3E2", 
-                    "target-arrow-shape": "triangle", 
-                    "line-color": "#C5D3E2", 
-                    "background-color": "#07ABA0", 
-                    'arrow-scale': 2, 
-                    'curve-style': 'bezier' 
-                },
-            },
-            {
-                "selector": 'node[id = "{}"]'.format(node['data']['id']),
-                "style": {
-                    'background-color': '#920000',
-                    "border-color": "#920000",
-                    "border-width": 2,
-                    "border-opacity": 1,
-                    "opacity": 1,
-                    "label": "data(label)",
-                    "color": "#920000", 
-                    "text-opacity": 1,
-                    "font-size": 12,
-                }
-            }]
-
-        for edge in node['edgesData']:
-            if edge['source'] == node['data']['id']:
-                stylesheet.append({
-                    "selector": 'node[id = "{}"]'.format(edge['target']),
-                    "style": {
-                        'background-color': '#ffdf4d',
-                        'opacity': 0.9
-                    }
-                })
-                stylesheet.append({
-                    "selector": 'edge[id= "{}"]'.format(edge['id']),
-                    "style": {
-                        "mid-target-arrow-color": '#ffdf4d',
-                        "mid-target-arrow-shape": "vee",
-                        "line-color": '#ffdf4d',
-                        'opacity': 0.9,
-                    }
-                })
-
-            if edge['target'] == node['data']['id']:
-                stylesheet.append({
-                    "selector": 'node[id = "{}"]'.format(edge['source']),
-                    "style": {
-                        'background-color': '#b66dff ',
-                        'opacity': 0.9,
-                    }
-                })
-                stylesheet.append({
-                    "selector": 'edge[id= "{}"]'.format(edge['id']),
-                    "style": {
-                        "mid-target-arrow-color": '#b66dff ',
-                        "mid-target-arrow-shape": "vee",
-                        "line-color": '#b66dff ',
-                        'opacity': 1,
-                    }
-                })
-
-        return stylesheet
-
-    elif node and sector:
-        stylesheet = [
-            {
-                "selector": 'node',
-                'style': {
-                    "opacity": 0.9,
-                    "label": "data(label)",
-                    "width": "data(node_size)",
-                    "height": "data(node_size)",
-                    "background-color": "#07ABA0",
-                    "color": "#008B80"
-                }
-            },
-            {
-                "selector": 'edge',
-                "style": {
-                    "target-arrow-color": "#C5D3E2",
-                    "target-arrow-shape": "triangle",
-                    "line-color": "#C5D3E2",
-                    "background-color": "#07ABA0",
-                    'arrow-scale': 2,
-                    'curve-style': 'bezier'
-                },
-            },
-            {
-                "selector": 'node[id = "{}"]'.format(node['data']['id']),
-                "style": {
-                    'background-color': '#920000',
-                    "border-color": "#920000",
-                    "border-width": 2,
-                    "border-opacity": 1,
-                    "opacity": 1,
-                    "label": "data(label)",
-                    "color": "#920000",
-                    "text-opacity": 1,
-                    "font-size": 12,
-                }
-            },
-                        {
-                'selector': f'[secteur ^= "{sector}"]',
-                'style': {
-                    'background-color': '#920000',
-                }
-            }
-            ]
+def as_list(value):
+    # multi dropdowns give a list, or a single value persisted from the former single dropdowns
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def generate_stylesheet(node, sector_ids, input, sizes, query):
+    # node : the tapped node (tapNode). As in assets/clientside.js, the neighbours are read from
+    # its drawn edges (edgesData), not from the citation table
+    sector_ids = tuple(sector_ids or ())
+    publications = tuple(as_list(input))
+    sizes = tuple(tuple(rule) for rule in sizes or ())
+    node_id = node['data']['id'] if node else None
+    cited_ids, citing_ids = neighbors_from_edges(node_id, node.get('edgesData') or []) if node else ((), ())
+    query = None if node else query_key(query)
+    cache = get_cache('stylesheets', codec=JSON)
+    key = (node_id, cited_ids, citing_ids, sector_ids, publications, sizes, query)
+    stylesheet = cache.get(key)
+    if stylesheet is None:
+        with phase('stylesheet'):
+            if node_id:
+                stylesheet = build_stylesheet(node_id, cited_ids, citing_ids, sector_ids, publications, sizes)
+            else:
+                stylesheet = build_stylesheet(
+                    sector_ids=sector_ids, publications=publications, size_rules=sizes, query=query
+                )
+        # sized by its JSON, as the other responses by their bytes
+        cache.set(key, stylesheet, size=len(JSON.dumps(stylesheet)))
+    return stylesheet
+
+
+# Highlighted sectors are sent as the explicit ids of the publications in any of the selected sectors,
+# of any of the selected document types and within the period (sencodex/membership.py)
+
+@app.callback(
+    Output('sector-highlight', 'data'),
+    [Input('sectors_dropdown', 'value'), Input('type_doc_dropdown', 'value'), Input('my-range-slider', 'value')],
+)
+def update_sector_highlight(sectors, type_docs, value):
+    sectors, type_docs = as_list(sectors), as_list(type_docs)
+    if not sectors and not type_docs:
+        return []
+    return list(get_membership().node_ids_for(sectors, type_docs, value[0], value[1]))
 
-        for edge in node['edgesData']:
-            if edge['source'] == node['data']['id']:
-                stylesheet.append({
-                    "selector": 'node[id = "{}"]'.format(edge['target']),
-                    "style": {
-                        'background-color': '#ffdf4d',
-                        'opacity': 0.9
-                    }
-                })
-                stylesheet.append({
-                    "selector": 'edge[id= "{}"]'.format(edge['id']),
-                    "style": {
-                        "mid-target-arrow-color": '#ffdf4d',
-                        "mid-target-arrow-shape": "vee",
-                        "line-color": '#ffdf4d',
-                        'opacity': 0.9,
-                    }
-                })
-
-            if edge['target'] == node['data']['id']:
-                stylesheet.append({
-                    "selector": 'node[id = "{}"]'.format(edge['source']),
-                    "style": {
-                        'background-color': '#b66dff ',
-                        'opacity': 0.9,
-                    }
-                })
-                stylesheet.append({
-                    "selector": 'edge[id= "{}"]'.format(edge['id']),
-                    "style": {
-                        "mid-target-arrow-color": '#b66dff ',
-                        "mid-target-arrow-shape": "vee",
-                        "line-color": '#b66dff ',
-                        'opacity': 1,
-                    }
-                })
-
-        return stylesheet
-
-    elif sector:
-        stylesheet = [
-            {
-                "selector": 'node',
-                'style': {
-                    "opacity": 0.9,
-                    "label": "data(label)",
-                    "width": "data(node_size)",
-                    "height": "data(node_size)",
-                    "background-color": "#07ABA0",
-                    "color": "#008B80"
-                }
-            },
-            {
-                "selector": 'edge',
-                "style": {
-                    "target-arrow-color": "#C5D3E2",
-                    "target-arrow-shape": "triangle",
-                    "line-color": "#C5D3E2",
-                    "background-color": "#07ABA0",
-                    'arrow-scale': 2,
-                    'curve-style': 'bezier'
-                },
-            },
-            {
-                'selector': f'[secteur ^= "{sector}"]',
-                'style': {
-                    'background-color': '#920000',
-                }
-            }
-        ]
-        return stylesheet
-
-    elif input:
-        stylesheet = [
-            {
-                "selector": 'node',
-                'style': {
-                    "opacity": 0.9,
-                    "label": "data(label)",
-                    "width": "data(node_size)",
-                    "height": "data(node_size)",
-                    "background-color": "#07ABA0",
-                    "color": "#008B80"
-                }
-            },
-            {
-                "selector": 'edge',
-                "style": {
-                    "target-arrow-color": "#C5D3E2",
-                    "target-arrow-shape": "triangle",
-                    "line-color": "#C5D3E2",
-                    "background-color": "#07ABA0",
-                    'arrow-scale': 2,
-                    'curve-style': 'bezier'
-                },
-            },
-            {
-                "selector": f'[id ^= "{input}"]',
-                "style": {
-                    'background-color': '#920000',
-                    "border-color": "#920000",
-                    
-                    "border-width": 2,
-                    "border-opacity": 1,
-                    "opacity": 1,
-                    "width": "200px",
-                    "height": "200px",
-                    "label": "data(label)",
-                    "color": "#920000",
-                    "text-opacity": 1,
-                    "font-size": 12,
-                }
-            },
-        ]
-        return stylesheet
-    
 
-# Callback 5 : Download data (xlsx format) when clicking on "Download data"
+@app.callback(
+    Output('sector-data', 'children'),
+    [Input('sectors_dropdown', 'value'), Input('type_doc_dropdown', 'value'), Input('my-range-slider', 'value')],
+)
+def display_sector_citations(sectors, type_docs, value):
+    sectors, type_docs = as_list(sectors), as_list(type_docs)
+    if not sectors and not type_docs:
+        return None
+    citations = get_temporal_citations().group_received(
+        slider_year(value[0]), slider_year(value[1]), sectors, type_docs)
+    return f"Quoted {citations:.0f} time(s) between 20{value[0]:02d} and 20{value[1]:02d}"
+
+
+# In the browser or on the server, the neighbours are read from the tapped node's edgesData
+
+stylesheet_dependencies = [
+    Output('cytoscape-layout', 'stylesheet'),
+    [Input('cytoscape-layout', 'tapNode'), Input('sector-highlight', 'data'),
+     Input(component_id='dropdown_node', component_property='value'), Input('size-rules', 'data'),
+     Input('query-result', 'data')]
+]
+if CLIENTSIDE_CALLBACKS:
+    app.clientside_callback(ClientsideFunction(namespace='stylesheet', function_name='generate'), *stylesheet_dependencies)
+else:
+    app.callback(*stylesheet_dependencies)(generate_stylesheet)
+
+# Callback 5 : Count the publications drawn in the viewport, with a link to download their data
+
+@app.callback(
+    Output("viewport-data", "children"),
+    [Input('cytoscape-layout', 'extent'), Input('cytoscape-layout', 'zoom'), Input('my-range-slider', 'value')],
+    prevent_initial_call=True,
+)
+def display_viewport(extent, zoom, value):
+    if not extent:
+        return no_update
+    level_of_detail = get_level_of_detail()
+    if not LEVEL_OF_DETAIL:
+        zoom = None if zoom is None else max(zoom, level_of_detail.detail_zoom)
+    publication_ids = level_of_detail.visible_node_ids(extent, zoom, value[0], value[1])
+    query = urlencode({
+        'x1': extent['x1'], 'y1': extent['y1'], 'x2': extent['x2'], 'y2': extent['y2'],
+        'zoom': zoom if zoom is not None else 1, 'start': value[0], 'end': value[1],
+    })
+    return [
+        f"{len(publication_ids)} publications in view. ",
+        html.A("Download their data", href=f"/export/citations.xlsx?{query}", target="_blank"),
+    ]
+
+# Callback 6 : Download data (xlsx format) of every selected node when clicking on "Download data"
 
 @app.callback(
     Output("download-dataframe-xlsx", "data"),
     Input("btn_xlsx", "n_clicks"),
     State("cytoscape-layout", "selectedNodeData"),
+    State("export-mode", "value"),
     prevent_initial_call=True,
 )
-def func(n_clicks, elements):
-    for element in elements:
-        data = df_export[(df_export['Publication A'] == element['id']) | (df_export['Publication B'] == element['id'])].reset_index()
-        return dcc.send_data_frame(data.to_excel, f"export_details_{element['id']}.xlsx", sheet_name="data")
+def func(n_clicks, elements, export_mode):
+    if not elements:
+        return None
+    publication_ids = list(dict.fromkeys(element['id'] for element in elements))
+    if len(publication_ids) == 1:
+        filename = f"export_details_{publication_ids[0]}.xlsx"
+    else:
+        filename = f"export_details_{len(publication_ids)}_publications.xlsx"
+
+    # workbooks are cached as bytes, shared by the workers with SEN_CODEX_CACHE=disk or redis
+    cache = get_cache('workbooks')
+    key = (tuple(publication_ids), export_mode == 'merged')
+    workbook = cache.get(key)
+    if workbook is None:
+        buffer = io.BytesIO()
+        with phase('excel'):
+            get_citation_index().write_workbook(buffer, publication_ids, merged=export_mode == 'merged')
+        workbook = buffer.getvalue()
+        cache.set(key, workbook, size=len(workbook))
+    return dcc.send_bytes(workbook, filename)
+
+# Callback 7 : Citation query from the selected publication (sencodex/queries.py). The result is
+# stored as [mode, node_ids, edge_ids] and highlighted by the stylesheet callback
+
+@app.callback(
+    [Output('query-result', 'data'), Output('query-data', 'children')],
+    [Input('dropdown_node', 'value'), Input('query-mode', 'value'), Input('query-hops', 'value'),
+     Input('path-target', 'value')],
+)
+def run_query(publications, mode, hops, target):
+    publications = tuple(as_list(publications))
+    if not publications or mode not in (ANCESTORS, DESCENDANTS, PATH):
+        return None, None
+    citation_queries = get_citation_queries()
+    if mode == PATH:
+        # from the first selected publication
+        publication = publications[0]
+        if not target:
+            return None, "Choose the publication at the other end of the path"
+        path = citation_queries.shortest_path(publication, target)
+        if not path:
+            return None, f"No citation path between {publication} and {target}"
+        edge_ids = [edge_id(*edge) for edge in path_edges(path)]
+        return [PATH, list(path), edge_ids], " → ".join(path)
+
+    hops = None if hops == ALL_HOPS else hops
+    publication_ids = citation_queries.relatives(publications, mode, hops)
+    quoted, quoting = citation_queries.reachable_counts(publications)
+    if mode == ANCESTORS:
+        summary = f"Relies on {len(publication_ids)} publication(s) within these hops, {quoted} in all"
+    else:
+        summary = f"{len(publication_ids)} publication(s) rely on the selection within these hops, {quoting} in all"
+    return [mode, list(publication_ids), []], summary
+
+# Callback 8 : Options of the publication dropdowns, matched on the server as the user types
+# (sencodex/search.py). The selected publications are kept among the options to stay displayed
+
+def search_options(search_value, value):
+    search_index = get_search_index()
+    with phase('search'):
+        return search_index.options(search_value or '', as_list(value))
+
+
+for dropdown_id in ['dropdown_node', 'path-target']:
+    app.callback(
+        Output(dropdown_id, 'options'),
+        [Input(dropdown_id, 'search_value')],
+        [State(dropdown_id, 'value')])(search_options)
+
+# Callback 9 : Size the nodes by a citation metric of the selected period (sencodex/analytics.py),
+# sent as one stylesheet rule per size bucket so that the elements are left untouched
+
+@app.callback(
+    Output('size-rules', 'data'),
+    [Input('size_dropdown', 'value'), Input('my-range-slider', 'value')],
+)
+def update_size_rules(metric, value):
+    if not metric or metric == 'node_size':
+        return []
+    if metric == 'received':
+        # from the prefix sums of the temporal cubes, over the same codes as the citation analytics
+        temporal_citations = get_temporal_citations()
+        citations = temporal_citations.received(slider_year(value[0]), slider_year(value[1]))
+        return size_rules(temporal_citations.ids, citations, get_range_node_mask(*value))
+    metrics = get_range_metrics(*value)
+    return size_rules(get_citation_analytics().ids, metrics[metric], metrics['nodes'])
 
 if __name__ == '__main__':
     app.run_server(host='0.0.0.0', debug=False )
\ No newline at end of file
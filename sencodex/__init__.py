@@ -0,0 +1,27 @@
+#Data layer of the SEN-CodeX network graph app
+
+import os
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+#Years covered by the range slider (2009 -> 9, ..., 2021 -> 21)
+
+FIRST_YEAR = 9
+LAST_YEAR = 21
+
+
+def publication_year(publication_id):
+    # publication ids start with the last two digits of their year (99-D-84, 21-D-30), None otherwise
+    if not publication_id[:2].isdigit():
+        return None
+    year = int(publication_id[:2])
+    return year + (1900 if year > 50 else 2000)
+
+
+def slider_year(value):
+    # year of a range slider value
+    return 2000 + value
+
+
+def slider_value(year):
+    return year - 2000
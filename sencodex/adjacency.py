@@ -0,0 +1,121 @@
+#Citation adjacency : publications encoded as integers and their citations stored as
+#CSR arrays in both directions, to answer neighbourhood queries on the server
+
+import numpy as np
+
+#Values of the "Publication A xx Publication B" column
+
+QUOTES = 'Quotes'
+
+
+def _csr(rows, columns, size):
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32)
+
+
+def gather(indptr, indices, frontier):
+    # concatenated neighbours of every node of the frontier, without a Python loop
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return indices[offsets]
+
+
+class Adjacency:
+
+    def __init__(self, ids, sources, targets):
+        self.ids = list(ids)
+        self.codes = {publication_id: code for code, publication_id in enumerate(self.ids)}
+        size = len(self.ids)
+
+        # one edge per (source, target) pair, source quoting target
+        pairs = np.unique(np.stack([np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)]), axis=1)
+        self.sources, self.targets = pairs[0], pairs[1]
+        self.out_indptr, self.out_indices = _csr(self.sources, self.targets, size)
+        self.in_indptr, self.in_indices = _csr(self.targets, self.sources, size)
+
+    @classmethod
+    def from_graph(cls, graph_index, citation_table=None):
+        # edges of the network graph, completed with the citations of the table
+        ids = [key for key in graph_index.keys if isinstance(key, str)]
+        pairs = [key for key in graph_index.keys if isinstance(key, tuple)]
+        if citation_table is not None:
+            for a, b, relation in zip(citation_table['Publication A'], citation_table['Publication B'],
+                                      citation_table['Publication A xx Publication B']):
+                pairs.append((a, b) if relation == QUOTES else (b, a))
+
+        codes = {publication_id: code for code, publication_id in enumerate(ids)}
+        for pair in pairs:
+            for publication_id in pair:
+                if publication_id not in codes:
+                    codes[publication_id] = len(ids)
+                    ids.append(publication_id)
+
+        sources = np.fromiter((codes[source] for source, _ in pairs), dtype=np.int64, count=len(pairs))
+        targets = np.fromiter((codes[target] for _, target in pairs), dtype=np.int64, count=len(pairs))
+        return cls(ids, sources, targets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, publication_id):
+        return publication_id in self.codes
+
+    def encode(self, publication_ids):
+        return np.array([self.codes[publication_id] for publication_id in publication_ids if publication_id in self.codes],
+                        dtype=np.int64)
+
+    def decode(self, codes):
+        return tuple(self.ids[code] for code in codes)
+
+    def out_codes(self, code):
+        return self.out_indices[self.out_indptr[code]:self.out_indptr[code + 1]]
+
+    def in_codes(self, code):
+        return self.in_indices[self.in_indptr[code]:self.in_indptr[code + 1]]
+
+    def out_neighbors(self, publication_id):
+        # publications quoted by publication_id
+        code = self.codes.get(publication_id)
+        if code is None:
+            return ()
+        return self.decode(self.out_codes(code))
+
+    def in_neighbors(self, publication_id):
+        # publications quoting publication_id
+        code = self.codes.get(publication_id)
+        if code is None:
+            return ()
+        return self.decode(self.in_codes(code))
+
+    def frontiers(self, publication_ids, hops, direction='both'):
+        # codes reached at each hop from publication_ids, following citations
+        # forwards ('out'), backwards ('in') or both ways
+        visited = np.zeros(len(self.ids), dtype=bool)
+        frontier = np.unique(self.encode(publication_ids))
+        visited[frontier] = True
+        frontiers = []
+        while len(frontier) and (hops is None or len(frontiers) < hops):
+            reached = []
+            if direction in ('out', 'both'):
+                reached.append(gather(self.out_indptr, self.out_indices, frontier))
+            if direction in ('in', 'both'):
+                reached.append(gather(self.in_indptr, self.in_indices, frontier))
+            frontier = np.unique(np.concatenate(reached))
+            frontier = frontier[~visited[frontier]]
+            visited[frontier] = True
+            if len(frontier):
+                frontiers.append(frontier)
+        return frontiers
+
+    def neighborhood(self, publication_id, hops=1, direction='both'):
+        # publications within hops citations of publication_id, itself excluded
+        frontiers = self.frontiers([publication_id], hops, direction)
+        if not frontiers:
+            return ()
+        return self.decode(np.sort(np.concatenate(frontiers)))
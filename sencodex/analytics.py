@@ -0,0 +1,151 @@
+#Citation analytics : the citation table as a sparse matrix (citing -> cited, weighted
+#by the number of citations), and influence metrics computed on the sub-graph of a
+#slider range with vectorized NumPy / SciPy operations
+
+import numpy as np
+from scipy import sparse
+
+from sencodex.adjacency import QUOTES
+from sencodex.cache import LRUCache
+from sencodex.metrics import phase
+
+METRICS = ['in_degree', 'out_degree', 'weighted_in', 'weighted_out', 'pagerank', 'hub', 'authority']
+
+
+def pagerank(matrix, damping=0.85, tolerance=1e-10, max_iterations=200):
+    # power iteration on the weighted matrix, dangling nodes spread their rank uniformly
+    size = matrix.shape[0]
+    if size == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(size), where=~dangling)
+    transition = sparse.diags(inverse) @ matrix
+    rank = np.full(size, 1.0 / size)
+    for _ in range(max_iterations):
+        previous = rank
+        rank = damping * (transition.T @ rank + rank[dangling].sum() / size) + (1 - damping) / size
+        if np.abs(rank - previous).sum() < tolerance:
+            break
+    return rank
+
+
+def hits(matrix, tolerance=1e-10, max_iterations=200):
+    # hub and authority scores, each normalized to sum to 1
+    size = matrix.shape[0]
+    hub = np.full(size, 1.0 / max(size, 1))
+    authority = hub
+    for _ in range(max_iterations):
+        authority = matrix.T @ hub
+        total = authority.sum()
+        if total == 0:
+            return np.zeros(size), np.zeros(size)
+        authority /= total
+        previous = hub
+        hub = matrix @ authority
+        hub /= hub.sum()
+        if np.abs(hub - previous).sum() < tolerance:
+            break
+    return hub, authority
+
+
+class CitationAnalytics:
+
+    def __init__(self, ids, citing, cited, weights):
+        self.ids = list(ids)
+        self.codes = {publication_id: code for code, publication_id in enumerate(self.ids)}
+        size = len(self.ids)
+        # the table lists each citation twice ("Quotes" and "Is quoted by"), keep one of them
+        matrix = sparse.coo_matrix(
+            (np.asarray(weights, dtype=np.float64), (np.asarray(citing), np.asarray(cited))), shape=(size, size)
+        ).tocsr()
+        matrix.sum_duplicates()
+        self.matrix = matrix
+        self.cache = LRUCache(max_entries=128)
+
+    @classmethod
+    def from_table(cls, table, ids):
+        # ids : publication ids in code order, completed with those only found in the table
+        ids = list(ids)
+        codes = {publication_id: code for code, publication_id in enumerate(ids)}
+        quotes = (table['Publication A xx Publication B'] == QUOTES).to_numpy()
+        citing = np.where(quotes, table['Publication A'], table['Publication B'])
+        cited = np.where(quotes, table['Publication B'], table['Publication A'])
+        for publication_id in np.concatenate([citing, cited]):
+            if publication_id not in codes:
+                codes[publication_id] = len(ids)
+                ids.append(publication_id)
+        pairs = np.stack([
+            np.fromiter((codes[publication_id] for publication_id in citing), dtype=np.int64, count=len(citing)),
+            np.fromiter((codes[publication_id] for publication_id in cited), dtype=np.int64, count=len(cited)),
+        ])
+        weights = table['Number'].to_numpy(dtype=np.float64)
+        pairs, first = np.unique(pairs, axis=1, return_index=True)
+        return cls(ids, pairs[0], pairs[1], weights[first])
+
+    def compute(self, node_mask=None):
+        # metrics of the sub-graph between the nodes of node_mask (all of them by default),
+        # as arrays over every code, zero outside of the mask
+        size = len(self.ids)
+        if node_mask is None:
+            node_mask = np.ones(size, dtype=bool)
+        nodes = np.flatnonzero(node_mask)
+        matrix = self.matrix[nodes][:, nodes]
+        binary = matrix.copy()
+        binary.data[:] = 1
+
+        local = {
+            'in_degree': np.asarray(binary.sum(axis=0)).ravel(),
+            'out_degree': np.asarray(binary.sum(axis=1)).ravel(),
+            'weighted_in': np.asarray(matrix.sum(axis=0)).ravel(),
+            'weighted_out': np.asarray(matrix.sum(axis=1)).ravel(),
+            'pagerank': pagerank(matrix),
+        }
+        local['hub'], local['authority'] = hits(matrix)
+
+        metrics = {}
+        for name, values in local.items():
+            metrics[name] = np.zeros(size)
+            metrics[name][nodes] = values
+        metrics['nodes'] = node_mask
+        return metrics
+
+    def metrics(self, key, node_mask):
+        # memoized per key (the slider range)
+        metrics = self.cache.get(key)
+        if metrics is None:
+            with phase('range metrics'):
+                metrics = self.compute(node_mask)
+            self.cache.set(key, metrics)
+        return metrics
+
+    def node_metrics(self, metrics, publication_id):
+        code = self.codes.get(publication_id)
+        if code is None or not metrics['nodes'][code]:
+            return None
+        values = {name: metrics[name][code] for name in METRICS}
+        # rank by PageRank among the nodes of the range (1 is the most influential)
+        values['pagerank_rank'] = int((metrics['pagerank'][metrics['nodes']] > values['pagerank']).sum()) + 1
+        values['nodes'] = int(metrics['nodes'].sum())
+        return values
+
+
+def size_rules(ids, values, node_mask, min_size=20, max_size=120, buckets=8):
+    # node sizes following values, as one stylesheet rule per size bucket : [selector, size] pairs
+    nodes = np.flatnonzero(node_mask)
+    if len(nodes) == 0:
+        return []
+    scores = np.asarray(values)[nodes]
+    # square root scale, citation counts are heavy tailed
+    scores = np.sqrt(np.maximum(scores, 0))
+    top = scores.max()
+    if top == 0:
+        return []
+    levels = np.minimum((scores / top * buckets).astype(np.int64), buckets - 1)
+    rules = []
+    for level in range(buckets):
+        members = nodes[levels == level]
+        if len(members):
+            size = int(round(min_size + (max_size - min_size) * level / (buckets - 1)))
+            rules.append([', '.join('node[id = "{}"]'.format(ids[code]) for code in members), size])
+    return rules
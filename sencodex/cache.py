@@ -0,0 +1,265 @@
+#Caches of the computed responses : a bounded-memory LRU shared by the callbacks of a
+#worker, and shared stores for every worker of a deployment, on disk (a tmpfs directory
+#such as /dev/shm keeps it in shared memory) or in Redis. Shared stores hold the values
+#encoded by the codec of their namespace, as plain bytes (no pickle : a store is never
+#trusted to run code), under keys prefixed with a namespace and the data version, so that
+#responses of former artifacts are never served.
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+
+#Backends of make_cache
+
+MEMORY = 'memory'
+DISK = 'disk'
+REDIS = 'redis'
+
+BACKENDS = (MEMORY, DISK, REDIS)
+
+DEFAULT_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class Codec:
+    # bytes of the values of a namespace in the shared stores, and back
+
+    def __init__(self, dumps, loads):
+        self.dumps = dumps
+        self.loads = loads
+
+
+BYTES = Codec(bytes, bytes)
+JSON = Codec(lambda value: json.dumps(value, separators=(',', ':')).encode('utf-8'),
+             lambda data: json.loads(data.decode('utf-8')))
+
+
+def private_directory(path):
+    # created with mode 0o700, and refused when it is not a directory of the current user closed
+    # to the others, since its files are read back by the app
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode) or (
+            hasattr(os, 'getuid') and (status.st_uid != os.getuid() or status.st_mode & 0o077)):
+        raise RuntimeError(f"{path} must be a directory of the current user with mode 0o700")
+    return path
+
+
+class LRUCache:
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=1):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    def _evict(self):
+        # drop least recently used entries, but always keep the newest one
+        while len(self._entries) > 1 and (
+            self.size > self.max_bytes
+            or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def cache_key(prefix, key):
+    # file and Redis name of a key, any repr-able value (strings, numbers, tuples of them)
+    return f"{prefix}-{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()}"
+
+
+def evict_oldest(entries, max_bytes, newest=None):
+    # removes files of entries (mtime, size, path), least recently used first, until they fit in
+    # max_bytes, but the newest one
+    size = sum(entry[1] for entry in entries)
+    for _, entry_size, path in sorted(entries):
+        if size <= max_bytes:
+            break
+        if path == newest:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            # removed by another worker
+            pass
+        size -= entry_size
+
+
+class DiskCache:
+    # one file per entry, written atomically, least recently read files removed first
+
+    def __init__(self, directory, prefix, max_bytes=256 * 1024 * 1024, codec=BYTES):
+        self.directory = private_directory(directory)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, cache_key(self.prefix, key) + '.bin')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = self.codec.loads(f.read())
+        except (OSError, ValueError):
+            # missing, or truncated
+            self.misses += 1
+            return default
+        try:
+            # the modification time orders the eviction
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key, value, size=None):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.codec.dumps(value))
+        os.replace(tmp_path, path)
+        self._evict(path)
+
+    def _entries(self, prefix=''):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefix) and entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # removed by another worker
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self, newest):
+        # over every file of the directory, so that the entries of former data versions go first
+        evict_oldest(self._entries(), self.max_bytes, newest)
+
+    def clear(self):
+        for _, _, path in self._entries(self.prefix + '-'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class RedisCache:
+    # entries expire after ttl seconds, the memory limit is the one of the Redis server (maxmemory)
+
+    def __init__(self, url, prefix, ttl=24 * 3600, codec=BYTES):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("the redis cache needs the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.codec = codec
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.client.get(cache_key(self.prefix, key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self.codec.loads(value)
+
+    def set(self, key, value, size=None):
+        self.client.set(cache_key(self.prefix, key), self.codec.dumps(value), ex=self.ttl)
+
+    def clear(self):
+        for name in self.client.scan_iter(f"{self.prefix}-*"):
+            self.client.delete(name)
+
+
+class TieredCache:
+    # worker LRU in front of a shared store, so that a value is only decoded once per worker
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is None:
+                return default
+            self.local.set(key, value, size=_size(value, self.shared.codec))
+        return value
+
+    def set(self, key, value, size=1):
+        self.local.set(key, value, size)
+        self.shared.set(key, value, size)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+def _size(value, codec):
+    # bytes of the payloads and range responses, of the encoded value for the others
+    if isinstance(value, bytes):
+        return len(value)
+    size = getattr(value, 'size', None)
+    return size if size is not None else len(codec.dumps(value))
+
+
+def make_cache(backend, namespace, version, max_bytes=64 * 1024 * 1024, max_entries=None,
+               directory=None, url=None, codec=BYTES):
+    # cache of one kind of responses (namespace) of the data version, in the given backend, the
+    # shared stores holding the values as the bytes of codec
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown cache backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    local = LRUCache(max_bytes=max_bytes, max_entries=max_entries)
+    if backend == MEMORY:
+        return local
+    if backend == DISK:
+        root = private_directory(os.path.join(directory or DEFAULT_DIRECTORY, 'sen-codex-cache'))
+        shared = DiskCache(os.path.join(root, namespace), version, max_bytes * 4, codec)
+    else:
+        shared = RedisCache(url or 'redis://localhost:6379/0', f"sen-codex-{namespace}-{version}", codec=codec)
+    return TieredCache(local, shared)
@@ -0,0 +1,36 @@
+#Citation index : row positions of the citation table grouped by publication,
+#so that the rows of a publication are found without scanning the whole table
+
+import numpy as np
+
+
+class CitationIndex:
+
+    def __init__(self, table):
+        self.table = table
+        # rows where the publication quotes another one, and rows where it is quoted
+        self.citing_rows = table.groupby('Publication A', sort=False).indices
+        self.cited_rows = table.groupby('Publication B', sort=False).indices
+
+    def rows(self, publication_ids):
+        # positions (in table order) of every row involving one of the publications
+        if isinstance(publication_ids, str):
+            publication_ids = [publication_ids]
+        empty = np.empty(0, dtype=np.intp)
+        positions = [self.citing_rows.get(publication_id, empty) for publication_id in publication_ids]
+        positions += [self.cited_rows.get(publication_id, empty) for publication_id in publication_ids]
+        return np.unique(np.concatenate(positions))
+
+    def frame(self, publication_ids):
+        return self.table.iloc[self.rows(publication_ids)].reset_index()
+
+    def write_workbook(self, buffer, publication_ids, merged=False):
+        # one sheet per publication, or a single sheet with the rows of all of them
+        import pandas as pd
+
+        with pd.ExcelWriter(buffer) as writer:
+            if merged:
+                self.frame(publication_ids).to_excel(writer, sheet_name="data")
+            else:
+                for publication_id in publication_ids:
+                    self.frame(publication_id).to_excel(writer, sheet_name=publication_id[:31])
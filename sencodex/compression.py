@@ -0,0 +1,76 @@
+#HTTP compression : content codings of the pre-compressed payloads (brotli when the brotli
+#package is installed, gzip otherwise), their negotiation with Accept-Encoding, and a Flask
+#middleware compressing the other responses (Dash callbacks, layout, assets) above a size
+#threshold.
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'text/')
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical from one worker to another
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"unknown content coding {encoding!r}")
+
+
+def accepted_encoding(accept_encoding, available=ENCODINGS):
+    # first of available the client accepts (q > 0), None for the identity
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, parameters = part.strip().partition(';')
+        quality = 1.0
+        if parameters.strip().startswith('q='):
+            try:
+                quality = float(parameters.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _compressible(response, min_size):
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+        and (response.content_length or 0) >= min_size
+    )
+
+
+def register_compression(server, min_size=1024, available=ENCODINGS):
+    # responses of at least min_size bytes, not already encoded nor streamed (files, CSV exports)
+    @server.after_request
+    def compress_response(response):
+        if not _compressible(response, min_size):
+            return response
+        encoding = accepted_encoding(request.headers.get('Accept-Encoding'), available)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return compress_response
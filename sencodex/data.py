@@ -0,0 +1,235 @@
+#Data sources of the app : each one is loaded on first use, once per worker,
+#and the time spent loading it is kept for the startup report
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+
+from sencodex import STATIC_DIR
+from sencodex.adjacency import Adjacency
+from sencodex.analytics import CitationAnalytics
+from sencodex.cache import BYTES, MEMORY, make_cache
+from sencodex.citation_index import CitationIndex
+from sencodex.graph_index import GraphIndex
+from sencodex.level_of_detail import LevelOfDetail
+from sencodex.membership import Membership
+from sencodex.metrics import observe_phase, register_cache
+from sencodex.graph_store import GRAPH_STORE, GraphStore
+from sencodex.queries import CitationQueries
+from sencodex.responses import RANGE_CODEC, RangeResponses
+from sencodex.search import SearchIndex
+from sencodex.spatial import SpatialIndex
+from sencodex.temporal import TemporalCitations
+
+logger = logging.getLogger(__name__)
+
+CITATIONS_CSV = os.path.join(STATIC_DIR, 'export_graph_1309.csv')
+
+timings = OrderedDict()
+
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings[phase] = timings.get(phase, 0.0) + seconds
+        observe_phase(phase, seconds)
+
+
+def report_startup(budget_ms=None):
+    total_ms = 1000 * sum(timings.values())
+    breakdown = ', '.join(f"{phase} {1000 * seconds:.1f} ms" for phase, seconds in timings.items())
+    logger.info("startup %.1f ms (%s)", total_ms, breakdown)
+    if budget_ms is not None and total_ms > budget_ms:
+        logger.warning("startup took %.1f ms, over the %.1f ms budget", total_ms, budget_ms)
+    return total_ms
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_data_version():
+    # digest of the data artifacts, changes whenever one of them is rebuilt
+    digest = hashlib.sha1()
+    for path in (GRAPH_STORE, CITATIONS_CSV):
+        digest.update(_file_digest(path).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def get_cache(namespace, max_entries=None, codec=BYTES):
+    # cache of one kind of responses : in the worker (SEN_CODEX_CACHE=memory, the default), or shared
+    # by the workers on disk (disk, in SEN_CODEX_CACHE_DIR) or in Redis (redis, at SEN_CODEX_REDIS_URL),
+    # encoded by codec (sencodex/cache.py). Each worker keeps at most SEN_CODEX_CACHE_MB per namespace in memory
+    backend = os.environ.get('SEN_CODEX_CACHE', MEMORY)
+    cache = make_cache(
+        backend,
+        namespace,
+        # the digests are only read for the shared caches, a worker cache never outlives its data
+        None if backend == MEMORY else get_data_version(),
+        max_bytes=int(os.environ.get('SEN_CODEX_CACHE_MB', 64)) * 1024 * 1024,
+        max_entries=max_entries,
+        directory=os.environ.get('SEN_CODEX_CACHE_DIR'),
+        url=os.environ.get('SEN_CODEX_REDIS_URL'),
+        codec=codec,
+    )
+    register_cache(namespace, cache)
+    return cache
+
+
+#Network graph
+
+@lru_cache(maxsize=None)
+def get_graph_index():
+    with timed('graph store'):
+        return GraphIndex.from_store(GraphStore())
+
+
+@lru_cache(maxsize=None)
+def get_range_responses():
+    # optionally computed for every range at startup (SEN_CODEX_WARM_UP=1), which with a shared
+    # cache only the first worker does
+    responses = RangeResponses(get_graph_index(), get_cache('ranges', codec=RANGE_CODEC))
+    if os.environ.get('SEN_CODEX_WARM_UP') == '1':
+        with timed('range warm-up'):
+            responses.warm_up()
+    return responses
+
+
+@lru_cache(maxsize=None)
+def get_spatial_index():
+    graph_index = get_graph_index()
+    with timed('spatial index'):
+        return SpatialIndex(graph_index)
+
+
+@lru_cache(maxsize=None)
+def get_membership():
+    graph_index = get_graph_index()
+    with timed('membership'):
+        return Membership(graph_index)
+
+
+@lru_cache(maxsize=None)
+def get_level_of_detail():
+    # thresholds of the major publications, shown at every zoom level, and zoom past which
+    # the other publications are shown
+    return LevelOfDetail(
+        get_graph_index(),
+        min_node_size=int(os.environ.get('SEN_CODEX_LOD_NODE_SIZE', 45)),
+        min_degree=int(os.environ.get('SEN_CODEX_LOD_DEGREE', 17)),
+        detail_zoom=float(os.environ.get('SEN_CODEX_LOD_ZOOM', 0.35)),
+        spatial_index=get_spatial_index(),
+    )
+
+
+#Citation table
+
+@lru_cache(maxsize=None)
+def get_citation_table():
+    # importing pandas takes longer than reading the table
+    with timed('pandas import'):
+        import pandas as pd
+    with timed('citation table'):
+        return pd.read_csv(CITATIONS_CSV, index_col=False, sep=',')
+
+
+@lru_cache(maxsize=None)
+def get_citation_index():
+    table = get_citation_table()
+    with timed('citation index'):
+        return CitationIndex(table)
+
+
+@lru_cache(maxsize=None)
+def get_publication_options():
+    table = get_citation_table()
+    with timed('publication options'):
+        return list(table['Publication A'].unique())
+
+
+@lru_cache(maxsize=None)
+def get_search_index():
+    # publications of the graph and citing publications of the table
+    graph_index = get_graph_index()
+    publication_ids = get_publication_options()
+    with timed('search index'):
+        return SearchIndex.from_graph(graph_index, publication_ids)
+
+
+@lru_cache(maxsize=None)
+def get_adjacency():
+    graph_index = get_graph_index()
+    citation_table = get_citation_table()
+    with timed('adjacency'):
+        return Adjacency.from_graph(graph_index, citation_table)
+
+
+@lru_cache(maxsize=None)
+def get_citation_queries():
+    citation_queries = CitationQueries(get_adjacency())
+    register_cache('queries', citation_queries.cache)
+    return citation_queries
+
+
+@lru_cache(maxsize=None)
+def get_citation_analytics():
+    adjacency = get_adjacency()
+    with timed('citation analytics'):
+        citation_analytics = CitationAnalytics.from_table(get_citation_table(), adjacency.ids)
+    register_cache('range metrics', citation_analytics.cache)
+    return citation_analytics
+
+
+@lru_cache(maxsize=None)
+def _graph_node_codes():
+    # code in the citation analytics of each node of the graph index
+    graph_index = get_graph_index()
+    codes = get_citation_analytics().codes
+    positions = np.flatnonzero(graph_index.is_node)
+    return positions, np.array([codes[graph_index.keys[position]] for position in positions], dtype=np.int64)
+
+
+def get_range_node_mask(start, end):
+    # publications of the graph in a slider range, over the codes of the citation analytics
+    positions, codes = _graph_node_codes()
+    node_mask = np.zeros(len(get_citation_analytics().ids), dtype=bool)
+    node_mask[codes[get_graph_index().range_selection(start, end)[positions]]] = True
+    return node_mask
+
+
+def get_range_metrics(start, end):
+    # influence metrics of the publications of a slider range, cached per range
+    return get_citation_analytics().metrics((start, end), get_range_node_mask(start, end))
+
+
+@lru_cache(maxsize=None)
+def get_temporal_citations():
+    # over the same codes as the citation analytics
+    analytics = get_citation_analytics()
+    graph_index = get_graph_index()
+    with timed('temporal citations'):
+        return TemporalCitations.from_analytics(analytics, graph_index)
+
+
+def preload():
+    get_range_responses()
+    get_publication_options()
+    get_citation_index()
+    get_adjacency()
+    get_spatial_index()
+    get_membership()
+    get_search_index()
+    get_temporal_citations()
@@ -0,0 +1,28 @@
+#Incremental updates of the graph elements : the browser holds the elements of a
+#selection in index order, so the server can turn the change between two selections
+#into a Dash Patch of deletions and insertions, without receiving the elements back
+
+from dash import Patch
+import numpy as np
+
+
+def selection_patch(elements, previous, selection, max_operations=None):
+    # Patch taking the elements of the boolean mask previous to those of selection, keeping
+    # them in index order. None when it would take more than max_operations (by default,
+    # the size of the new selection) : sending the whole list is then cheaper.
+    removed = previous & ~selection
+    added = selection & ~previous
+    final = np.flatnonzero(selection)
+    if max_operations is None:
+        max_operations = len(final)
+    if int(removed.sum()) + int(added.sum()) > max_operations:
+        return None
+
+    patch = Patch()
+    # deletions from the end, so that the indices still to delete do not move
+    for index in np.flatnonzero(removed[np.flatnonzero(previous)])[::-1]:
+        del patch[int(index)]
+    # insertions in increasing order of their final index
+    for index in np.flatnonzero(added[final]):
+        patch.insert(int(index), elements[final[index]])
+    return patch
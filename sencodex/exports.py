@@ -0,0 +1,171 @@
+#Bulk export of the citation table, served by Flask outside of the Dash callbacks
+#
+#    /export/citations.<csv|parquet|xlsx>?id=21-D-30&id=20-A-08
+#    /export/citations.csv?ids=21-D-30,20-A-08
+#    /export/citations.parquet?start=12&end=15
+#    /export/citations.xlsx?x1=-2000&y1=-2000&x2=0&y2=0&zoom=0.5&start=12&end=15
+#
+#Generated files are kept on disk (SEN_CODEX_EXPORT_DIR, a directory of the app user only),
+#named after a hash of their content (data version, format and selected rows), and streamed
+#in chunks. The least recently served files are removed past SEN_CODEX_EXPORT_MB.
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from flask import Response, abort, request, send_file
+
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.cache import evict_oldest, private_directory
+from sencodex.data import get_citation_index, get_data_version, get_graph_index, get_level_of_detail
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get('SEN_CODEX_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'sen-codex-exports'))
+EXPORT_MAX_BYTES = int(os.environ.get('SEN_CODEX_EXPORT_MB', 256)) * 1024 * 1024
+
+CHUNK_ROWS = 1000
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _year_range(args):
+    try:
+        start = int(args.get('start', args.get('end', FIRST_YEAR)))
+        end = int(args.get('end', start if 'start' in args else LAST_YEAR))
+    except ValueError:
+        abort(400, "start and end must be slider values (9 for 2009, ..., 21 for 2021)")
+    return start, end
+
+
+def _extent(args):
+    try:
+        return {name: float(args[name]) for name in ('x1', 'y1', 'x2', 'y2')}, float(args.get('zoom', 1))
+    except (KeyError, ValueError):
+        abort(400, "a viewport needs numeric x1, y1, x2, y2 (and optionally zoom)")
+
+
+def requested_publications(args):
+    # publication ids given one by one, as a comma separated list, as a year range,
+    # or drawn in a viewport (x1, y1, x2, y2, zoom) of the years start to end
+    publication_ids = list(args.getlist('id'))
+    for ids in args.getlist('ids'):
+        publication_ids.extend(publication_id for publication_id in ids.split(',') if publication_id)
+    if 'x1' in args:
+        extent, zoom = _extent(args)
+        publication_ids.extend(get_level_of_detail().visible_node_ids(extent, zoom, *_year_range(args)))
+    elif 'start' in args or 'end' in args:
+        publication_ids.extend(get_graph_index().node_ids_for_range(*_year_range(args)))
+    if not publication_ids:
+        abort(400, "give publication ids (id, ids), a year range (start, end) or a viewport (x1, y1, x2, y2)")
+    return list(dict.fromkeys(publication_ids))
+
+
+def export_path(export_format, rows):
+    digest = hashlib.sha1()
+    digest.update(get_data_version().encode('ascii'))
+    digest.update(export_format.encode('ascii'))
+    digest.update(rows.tobytes())
+    return os.path.join(EXPORT_DIR, f"{digest.hexdigest()}.{export_format}")
+
+
+def _temporary_path(path):
+    # keeps the extension, which pandas uses to pick the writer. Unique per thread, as the
+    # threads of a worker can write the same export at the same time
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}.{threading.get_ident()}.tmp{extension}"
+
+
+def _evict(newest):
+    # complete exports only, the temporary files are being written
+    entries = []
+    for entry in os.scandir(EXPORT_DIR):
+        if '.tmp' in entry.name:
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    evict_oldest(entries, EXPORT_MAX_BYTES, newest)
+
+
+def _write_file(frame, export_format, path):
+    tmp_path = _temporary_path(path)
+    if export_format == 'parquet':
+        try:
+            frame.to_parquet(tmp_path, index=False)
+        except ImportError:
+            abort(501, "parquet exports need pyarrow")
+    else:
+        frame.to_excel(tmp_path, sheet_name="data", index=False)
+    os.replace(tmp_path, path)
+    _evict(path)
+
+
+def _stream_csv(frame, path):
+    # send the rows while they are written to the cache, the file is kept only once complete
+    tmp_path = _temporary_path(path)
+    complete = False
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            for start in range(0, max(len(frame), 1), CHUNK_ROWS):
+                chunk = frame.iloc[start:start + CHUNK_ROWS].to_csv(index=False, header=start == 0)
+                f.write(chunk)
+                yield chunk.encode('utf-8')
+        complete = True
+    finally:
+        if complete:
+            os.replace(tmp_path, path)
+            _evict(path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_citations(export_format):
+    if export_format not in MIMETYPES:
+        abort(404)
+    publication_ids = requested_publications(request.args)
+    try:
+        # created again if it was removed
+        private_directory(EXPORT_DIR)
+    except (OSError, RuntimeError):
+        abort(503, "the export directory cannot be used")
+    citation_index = get_citation_index()
+    rows = citation_index.rows(publication_ids)
+    path = export_path(export_format, rows)
+    if len(publication_ids) == 1:
+        download_name = f"export_details_{publication_ids[0]}.{export_format}"
+    else:
+        download_name = f"export_details_{len(publication_ids)}_publications.{export_format}"
+
+    if os.path.exists(path):
+        # the modification time orders the eviction
+        os.utime(path)
+    else:
+        frame = citation_index.table.iloc[rows].reset_index()
+        if export_format == 'csv':
+            return Response(
+                _stream_csv(frame, path),
+                mimetype=MIMETYPES['csv'],
+                headers={'Content-Disposition': f'attachment; filename="{download_name}"'},
+            )
+        _write_file(frame, export_format, path)
+
+    return send_file(path, mimetype=MIMETYPES[export_format], as_attachment=True, download_name=download_name)
+
+
+def register_export_routes(server):
+    # the export directory is checked once at startup, exports answer 503 until it is fixed
+    try:
+        private_directory(EXPORT_DIR)
+    except (OSError, RuntimeError) as error:
+        logger.error("exports are unavailable : %s. Set SEN_CODEX_EXPORT_DIR to another directory, "
+                     "or restrict this one to the user of the app (chmod 700)", error)
+    server.add_url_rule('/export/citations.<export_format>', 'export_citations', export_citations)
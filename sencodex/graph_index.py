@@ -0,0 +1,131 @@
+#Graph index : every element of the network loaded once, keyed by element id,
+#with a bitmask of the years (slider values) it belongs to
+
+import os
+import pickle
+
+import blosc
+import numpy as np
+
+from sencodex import STATIC_DIR, FIRST_YEAR, LAST_YEAR
+from sencodex.graph_model import ElementTable
+
+
+def load_dat(path):
+    with open(path, "rb") as f:
+        compressed_pickle = f.read()
+
+    depressed_pickle = blosc.decompress(compressed_pickle)
+    # turn bytes object back into data
+    return pickle.loads(depressed_pickle)
+
+
+def element_key(element):
+    # nodes carry an id, edges are identified by their (source, target) pair
+    data = element['data']
+    if 'source' in data:
+        return (data['source'], data['target'])
+    return data['id']
+
+
+def year_bit(year):
+    return 1 << (year - FIRST_YEAR)
+
+
+def range_mask(start, end):
+    start = max(start, FIRST_YEAR)
+    end = min(end, LAST_YEAR)
+    if start > end:
+        return 0
+    return ((1 << (end - start + 1)) - 1) << (start - FIRST_YEAR)
+
+
+class GraphIndex:
+
+    def __init__(self, keys, elements, masks):
+        # elements : list of element dicts, or an ElementTable (sencodex/graph_model.py)
+        # materializing them on access
+        self.keys = keys
+        self.elements = elements
+        self.masks = np.asarray(masks, dtype=np.uint16)
+        self.positions = {key: position for position, key in enumerate(keys)}
+
+        # numeric columns, one row per element : preset position and size of the nodes,
+        # positions of the source and target nodes of the edges (-1 for nodes)
+        self.is_node = np.array([isinstance(key, str) for key in keys], dtype=bool)
+        if isinstance(elements, ElementTable):
+            # nodes first, so node rows are element positions
+            edge_padding = np.full(elements.edge_count, np.nan)
+            self.x = np.concatenate([elements.nodes['x'], edge_padding])
+            self.y = np.concatenate([elements.nodes['y'], edge_padding])
+            self.node_size = np.concatenate([elements.nodes['node_size'], np.zeros(elements.edge_count)]).astype(np.int32)
+            node_padding = np.full(elements.node_count, -1, dtype=np.int64)
+            self.source = np.concatenate([node_padding, elements.edges['source']]).astype(np.int64)
+            self.target = np.concatenate([node_padding, elements.edges['target']]).astype(np.int64)
+            return
+        self.x = np.array([element.get('position', {}).get('x', np.nan) for element in elements], dtype=np.float64)
+        self.y = np.array([element.get('position', {}).get('y', np.nan) for element in elements], dtype=np.float64)
+        self.node_size = np.array([element['data'].get('node_size', 0) for element in elements], dtype=np.int32)
+        self.source = np.array([-1 if isinstance(key, str) else self.positions[key[0]] for key in keys], dtype=np.int64)
+        self.target = np.array([-1 if isinstance(key, str) else self.positions[key[1]] for key in keys], dtype=np.int64)
+
+    @classmethod
+    def from_snapshots(cls, elements, year_elements):
+        keys = []
+        indexed = []
+        masks = []
+        positions = {}
+
+        def add(element):
+            key = element_key(element)
+            position = positions.get(key)
+            if position is None:
+                position = len(indexed)
+                positions[key] = position
+                keys.append(key)
+                indexed.append(element)
+                masks.append(0)
+            return position
+
+        # the full graph gives the canonical version of each element
+        for element in elements:
+            add(element)
+
+        for year, yearly in year_elements.items():
+            bit = year_bit(year)
+            for element in yearly:
+                masks[add(element)] |= bit
+
+        return cls(keys, indexed, masks)
+
+    @classmethod
+    def from_dat_files(cls, static_dir=STATIC_DIR):
+        elements = load_dat(os.path.join(static_dir, "elements_m1.dat"))
+        year_elements = {
+            year: load_dat(os.path.join(static_dir, f"elements_m1_{year}.dat"))
+            for year in range(FIRST_YEAR, LAST_YEAR + 1)
+        }
+        return cls.from_snapshots(elements, year_elements)
+
+    @classmethod
+    def from_store(cls, store):
+        elements = ElementTable.from_store(store)
+        masks = np.concatenate([store.nodes['years'], store.edges['years']])
+        return cls(elements.keys(), elements, masks)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def get(self, key):
+        position = self.positions.get(key)
+        if position is None:
+            return None
+        return self.elements[position]
+
+    def range_selection(self, start, end):
+        # boolean mask of the elements of the years [start, end]
+        return (self.masks & range_mask(start, end)) != 0
+
+    def node_ids_for_range(self, start, end):
+        positions = np.flatnonzero(self.masks & range_mask(start, end))
+        return [self.keys[position] for position in positions if isinstance(self.keys[position], str)]
@@ -0,0 +1,121 @@
+#Compact graph model : the elements of the network held as columns rather than as
+#Cytoscape dicts. Ids are interned strings, numeric fields NumPy arrays, secteur and
+#type_doc categorical codes, and the long strings (dates, titles) stay in the memory-mapped
+#store. Element dicts are only materialized when a response is built.
+
+import sys
+
+import numpy as np
+
+from sencodex.graph_store import edge_id
+
+
+class Categorical:
+    # codes into a list of categories, -1 for a missing value
+
+    def __init__(self, codes, categories):
+        self.codes = np.asarray(codes, dtype=np.int16)
+        self.categories = list(categories)
+
+    @classmethod
+    def from_values(cls, values):
+        # values : strings, None when missing
+        categories = sorted(set(value for value in values if value is not None))
+        index = {category: code for code, category in enumerate(categories)}
+        return cls([-1 if value is None else index[value] for value in values], categories)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        code = self.codes[row]
+        return None if code < 0 else self.categories[code]
+
+
+class ElementTable:
+    # read-only sequence of the elements of the network, nodes first then edges
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+        self.node_count = len(nodes['id'])
+        self.edge_count = len(edges['source'])
+
+    @classmethod
+    def from_store(cls, store):
+        # columns of the graph store (sencodex/graph_store.py) : strings are decoded once for
+        # the ids and the categories, dates and titles are decoded on access
+        nodes = store.nodes
+        edges = store.edges
+        null = nodes['secteur.null']
+        ids = [sys.intern(value.decode('utf-8')) for value in nodes['id']]
+        labels = [value.decode('utf-8') for value in nodes['label']]
+        return cls(
+            {
+                'id': ids,
+                # labels are only kept when they differ from the ids
+                'label': None if labels == ids else labels,
+                'detailed': np.asarray(nodes['detailed']),
+                'datetime': nodes['datetime'],
+                'type_doc': Categorical.from_values([value.decode('utf-8') for value in nodes['type_doc']]),
+                'secteur': Categorical.from_values(
+                    [None if null[row] else value.decode('utf-8') for row, value in enumerate(nodes['secteur'])]),
+                'titre': nodes['titre'],
+                'Pages vues': np.asarray(nodes['Pages vues']),
+                'node_size': np.asarray(nodes['node_size']),
+                'x': np.asarray(nodes['x']),
+                'y': np.asarray(nodes['y']),
+            },
+            {
+                'source': np.asarray(edges['source']),
+                'target': np.asarray(edges['target']),
+                'cited_occurences': np.asarray(edges['cited_occurences']),
+            },
+        )
+
+    def __len__(self):
+        return self.node_count + self.edge_count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        if position < self.node_count:
+            return self.node(position)
+        return self.edge(position - self.node_count)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def keys(self):
+        # element keys (sencodex/graph_index.py) : node ids, then (source, target) pairs
+        ids = self.nodes['id']
+        return list(ids) + [(ids[source], ids[target]) for source, target in zip(self.edges['source'], self.edges['target'])]
+
+    def node(self, row):
+        nodes = self.nodes
+        node_id = nodes['id'][row]
+        data = {'id': node_id, 'label': node_id if nodes['label'] is None else nodes['label'][row]}
+        if nodes['detailed'][row]:
+            data['datetime'] = nodes['datetime'][row].decode('utf-8')
+            data['type_doc'] = nodes['type_doc'][row]
+            data['secteur'] = nodes['secteur'][row]
+            data['titre'] = nodes['titre'][row].decode('utf-8')
+            data['Pages vues'] = int(nodes['Pages vues'][row])
+        data['node_size'] = int(nodes['node_size'][row])
+        return {'data': data, 'position': {'x': float(nodes['x'][row]), 'y': float(nodes['y'][row])}}
+
+    def edge(self, row):
+        ids = self.nodes['id']
+        source = ids[self.edges['source'][row]]
+        target = ids[self.edges['target'][row]]
+        return {
+            'data': {
+                'id': edge_id(source, target),
+                'source': source,
+                'target': target,
+                'cited_occurences': int(self.edges['cited_occurences'][row]),
+            }
+        }
@@ -0,0 +1,191 @@
+#Graph store : the network held once on disk as node and edge column tables,
+#memory-mapped so that every worker shares the same pages
+#
+#File layout : MAGIC, header length (uint64), JSON header, then one 64-byte aligned
+#block per column. The header gives, for each table, its row count and the dtype
+#and offset of its columns.
+#
+#Convert the legacy blosc + pickle snapshots with :
+#    python -m sencodex.graph_store [static_dir] [output]
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+from sencodex import STATIC_DIR
+
+MAGIC = b'SENCODEX'
+VERSION = 1
+ALIGNMENT = 64
+
+GRAPH_STORE = os.path.join(STATIC_DIR, 'graph_m1.store')
+
+#Node attributes stored as utf-8 strings, and those that can be missing (NaN in the snapshots)
+
+STRING_COLUMNS = ['id', 'label', 'datetime', 'type_doc', 'secteur', 'titre']
+NULLABLE_COLUMNS = ['secteur']
+
+#Attributes only present on publications with details (the others only have id, label and size)
+
+DETAIL_COLUMNS = ['datetime', 'type_doc', 'secteur', 'titre', 'Pages vues']
+
+
+def _padding(size):
+    return -size % ALIGNMENT
+
+
+def write_store(path, tables, meta=None):
+    header = {'version': VERSION, 'meta': meta or {}, 'tables': {}}
+    blocks = []
+    offset = 0
+    for table_name, columns in tables.items():
+        rows = None
+        table_header = {'columns': {}}
+        for column_name, values in columns.items():
+            values = np.ascontiguousarray(values)
+            if rows is None:
+                rows = len(values)
+            elif len(values) != rows:
+                raise ValueError(f"column {table_name}.{column_name} has {len(values)} rows, expected {rows}")
+            table_header['columns'][column_name] = {'dtype': values.dtype.str, 'offset': offset}
+            blocks.append(values)
+            offset += values.nbytes + _padding(values.nbytes)
+        table_header['rows'] = rows or 0
+        header['tables'][table_name] = table_header
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header_bytes)
+    data_start += _padding(data_start)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', data_start))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_start - f.tell()))
+        for values in blocks:
+            f.write(values.tobytes())
+            f.write(b'\0' * _padding(values.nbytes))
+    os.replace(tmp_path, path)
+
+
+class GraphStore:
+
+    def __init__(self, path=GRAPH_STORE):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a graph store")
+            data_start, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(data_start - len(MAGIC) - 8).rstrip(b'\0'))
+        if header['version'] != VERSION:
+            raise ValueError(f"{path} has version {header['version']}, expected {VERSION}")
+        self.meta = header['meta']
+
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        self.tables = {}
+        for table_name, table_header in header['tables'].items():
+            self.tables[table_name] = {
+                column_name: np.ndarray(
+                    shape=(table_header['rows'],),
+                    dtype=np.dtype(column['dtype']),
+                    buffer=self._buffer,
+                    offset=data_start + column['offset'],
+                )
+                for column_name, column in table_header['columns'].items()
+            }
+
+    @property
+    def nodes(self):
+        return self.tables['nodes']
+
+    @property
+    def edges(self):
+        return self.tables['edges']
+
+    def node_elements(self, rows=None):
+        nodes = self.nodes
+        if rows is None:
+            rows = range(len(nodes['id']))
+        elements = []
+        for row in rows:
+            data = {
+                'id': nodes['id'][row].decode('utf-8'),
+                'label': nodes['label'][row].decode('utf-8'),
+            }
+            if nodes['detailed'][row]:
+                data['datetime'] = nodes['datetime'][row].decode('utf-8')
+                data['type_doc'] = nodes['type_doc'][row].decode('utf-8')
+                data['secteur'] = None if nodes['secteur.null'][row] else nodes['secteur'][row].decode('utf-8')
+                data['titre'] = nodes['titre'][row].decode('utf-8')
+                data['Pages vues'] = int(nodes['Pages vues'][row])
+            data['node_size'] = int(nodes['node_size'][row])
+            elements.append({
+                'data': data,
+                'position': {'x': float(nodes['x'][row]), 'y': float(nodes['y'][row])},
+            })
+        return elements
+
+
+def edge_id(source, target):
+    return f"{source}->{target}"
+
+
+def _string_column(values):
+    return np.array([value.encode('utf-8') for value in values], dtype=bytes)
+
+
+def graph_tables(graph_index):
+    # split the indexed elements into a node table and an edge table
+    nodes = []
+    node_masks = []
+    edges = []
+    edge_masks = []
+    for element, mask in zip(graph_index.elements, graph_index.masks):
+        if 'source' in element['data']:
+            edges.append(element)
+            edge_masks.append(mask)
+        else:
+            nodes.append(element)
+            node_masks.append(mask)
+
+    node_rows = {element['data']['id']: row for row, element in enumerate(nodes)}
+
+    node_columns = {}
+    detailed = [all(column in element['data'] for column in DETAIL_COLUMNS) for element in nodes]
+    node_columns['detailed'] = np.array(detailed, dtype=bool)
+    for column in STRING_COLUMNS:
+        values = [element['data'].get(column) for element in nodes]
+        if column in NULLABLE_COLUMNS:
+            node_columns[column + '.null'] = np.array([not isinstance(value, str) for value in values], dtype=bool)
+        node_columns[column] = _string_column([value if isinstance(value, str) else '' for value in values])
+    node_columns['Pages vues'] = np.array(
+        [element['data'].get('Pages vues', 0) for element in nodes], dtype=np.int32)
+    node_columns['node_size'] = np.array([element['data']['node_size'] for element in nodes], dtype=np.int32)
+    node_columns['x'] = np.array([element['position']['x'] for element in nodes], dtype=np.float64)
+    node_columns['y'] = np.array([element['position']['y'] for element in nodes], dtype=np.float64)
+    node_columns['years'] = np.array(node_masks, dtype=np.uint16)
+
+    edge_columns = {
+        'source': np.array([node_rows[element['data']['source']] for element in edges], dtype=np.int32),
+        'target': np.array([node_rows[element['data']['target']] for element in edges], dtype=np.int32),
+        'cited_occurences': np.array([element['data']['cited_occurences'] for element in edges], dtype=np.int32),
+        'years': np.array(edge_masks, dtype=np.uint16),
+    }
+    return {'nodes': node_columns, 'edges': edge_columns}
+
+
+def convert_dat_files(static_dir=STATIC_DIR, path=None):
+    from sencodex.graph_index import GraphIndex
+
+    graph_index = GraphIndex.from_dat_files(static_dir)
+    path = path or os.path.join(static_dir, 'graph_m1.store')
+    write_store(path, graph_tables(graph_index), meta={'source': 'elements_m1*.dat'})
+    return path
+
+
+if __name__ == '__main__':
+    print(convert_dat_files(*sys.argv[1:3]))
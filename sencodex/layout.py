@@ -0,0 +1,140 @@
+#Incremental layout : publications already placed keep their preset positions, and new
+#publications are placed among them by a force simulation (Fruchterman-Reingold forces)
+#run on the new nodes only. Repulsion is exact from the nodes of the neighbouring cells of
+#a uniform grid and approximated by the centroid of every farther cell (Barnes-Hut style),
+#all of it vectorized over the moving nodes.
+
+import numpy as np
+
+from sencodex.adjacency import gather
+from sencodex.spatial import GridIndex
+
+
+def ideal_length(positions, sources, targets):
+    # median length of the edges between placed nodes, the spring length of the simulation
+    lengths = np.hypot(*(positions[sources] - positions[targets]).T)
+    lengths = lengths[lengths > 0]
+    return float(np.median(lengths)) if len(lengths) else 100.0
+
+
+def initial_positions(positions, pinned, sources, targets, length, seed=0):
+    # unplaced nodes at the mean position of their placed neighbours, in as many passes
+    # as needed, with some jitter so that siblings do not start on the same point
+    positions = np.array(positions, dtype=np.float64)
+    placed = np.array(pinned, dtype=bool)
+    random = np.random.default_rng(seed)
+    center = positions[placed].mean(axis=0) if placed.any() else np.zeros(2)
+    while not placed.all():
+        ends = np.concatenate([sources, targets])
+        others = np.concatenate([targets, sources])
+        usable = ~placed[ends] & placed[others]
+        if not usable.any():
+            # disconnected from every placed node : around the center of the layout
+            rest = np.flatnonzero(~placed)
+            positions[rest] = center + random.normal(scale=length, size=(len(rest), 2))
+            break
+        counts = np.bincount(ends[usable], minlength=len(positions))
+        sums = np.stack([np.bincount(ends[usable], weights=positions[others[usable], axis], minlength=len(positions))
+                         for axis in (0, 1)], axis=1)
+        reached = counts > 0
+        positions[reached] = sums[reached] / counts[reached, None]
+        positions[reached] += random.normal(scale=length / 4, size=(int(reached.sum()), 2))
+        placed |= reached
+    return positions
+
+
+def repulsion(positions, moving, spacing, cells_per_side=16):
+    # repulsive force spacing^2 / d on each moving node
+    grid = GridIndex(positions[:, 0], positions[:, 1], np.arange(len(positions)), cells_per_side)
+    columns, lines = grid.coordinates(positions[moving, 0], positions[moving, 1])
+    force = np.zeros((len(moving), 2))
+
+    # near field : every node of the 3 x 3 neighbouring cells
+    offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    near_columns = columns[:, None] + offsets[:, 0]
+    near_lines = lines[:, None] + offsets[:, 1]
+    valid = (near_columns >= 0) & (near_columns < cells_per_side) & (near_lines >= 0) & (near_lines < cells_per_side)
+    cells = (near_columns * cells_per_side + near_lines)[valid]
+    owners = np.repeat(np.arange(len(moving)), valid.sum(axis=1))
+    counts = grid.indptr[cells + 1] - grid.indptr[cells]
+    members = gather(grid.indptr, grid.indices, cells)
+    owners = np.repeat(owners, counts)
+    keep = members != moving[owners]
+    owners, members = owners[keep], members[keep]
+    delta = positions[moving[owners]] - positions[members]
+    distance2 = np.maximum((delta ** 2).sum(axis=1), 1e-2 * spacing ** 2)
+    for axis in (0, 1):
+        force[:, axis] += np.bincount(owners, weights=spacing ** 2 * delta[:, axis] / distance2, minlength=len(moving))
+
+    # far field : the other cells, each as its node count at its centroid
+    cell_counts = np.diff(grid.indptr)
+    occupied = np.flatnonzero(cell_counts)
+    all_columns, all_lines = grid.coordinates(positions[:, 0], positions[:, 1])
+    all_cells = all_columns * cells_per_side + all_lines
+    centroids = np.stack([np.bincount(all_cells, weights=positions[:, axis], minlength=cells_per_side ** 2)
+                          for axis in (0, 1)], axis=1)[occupied] / cell_counts[occupied, None]
+    far = ((np.abs(occupied[None, :] // cells_per_side - columns[:, None]) > 1)
+           | (np.abs(occupied[None, :] % cells_per_side - lines[:, None]) > 1))
+    delta = positions[moving][:, None, :] - centroids[None, :, :]
+    distance2 = np.maximum((delta ** 2).sum(axis=2), 1e-2 * spacing ** 2)
+    weights = np.where(far, cell_counts[occupied][None, :] * spacing ** 2 / distance2, 0)
+    force += (weights[:, :, None] * delta).sum(axis=1)
+    return force
+
+
+def attraction(positions, moving, sources, targets, length):
+    # spring force d^2 / k along the edges, on their moving ends
+    index = np.full(len(positions), -1, dtype=np.int64)
+    index[moving] = np.arange(len(moving))
+    force = np.zeros((len(moving), 2))
+    delta = positions[targets] - positions[sources]
+    pull = delta * np.hypot(*delta.T)[:, None] / length
+    for ends, sign in ((sources, 1), (targets, -1)):
+        on_moving = index[ends] >= 0
+        for axis in (0, 1):
+            force[:, axis] += np.bincount(index[ends[on_moving]], weights=sign * pull[on_moving, axis],
+                                          minlength=len(moving))
+    return force
+
+
+def node_spacing(positions, cells_per_side=32):
+    # median distance between a node and its nearest neighbour, looked up in the neighbouring grid cells
+    grid = GridIndex(positions[:, 0], positions[:, 1], np.arange(len(positions)), cells_per_side)
+    columns, lines = grid.coordinates(positions[:, 0], positions[:, 1])
+    nearest = np.full(len(positions), np.inf)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            near_columns, near_lines = columns + dx, lines + dy
+            valid = np.flatnonzero((near_columns >= 0) & (near_columns < cells_per_side)
+                                   & (near_lines >= 0) & (near_lines < cells_per_side))
+            cells = near_columns[valid] * cells_per_side + near_lines[valid]
+            members = gather(grid.indptr, grid.indices, cells)
+            owners = np.repeat(valid, grid.indptr[cells + 1] - grid.indptr[cells])
+            distance = np.hypot(*(positions[owners] - positions[members]).T)
+            distance[owners == members] = np.inf
+            np.minimum.at(nearest, owners, distance)
+    nearest = nearest[np.isfinite(nearest) & (nearest > 0)]
+    return float(np.median(nearest)) if len(nearest) else 1.0
+
+
+def incremental_layout(positions, pinned, sources, targets, iterations=150, seed=0):
+    # positions : (n, 2) array, only read for the pinned nodes. sources, targets : edges as node rows
+    positions = np.asarray(positions, dtype=np.float64)
+    pinned = np.asarray(pinned, dtype=bool)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    moving = np.flatnonzero(~pinned)
+    if len(moving) == 0:
+        return positions.copy()
+
+    placed_edges = pinned[sources] & pinned[targets]
+    length = ideal_length(positions, sources[placed_edges], targets[placed_edges])
+    spacing = node_spacing(positions[pinned]) if pinned.sum() > 1 else length
+    positions = initial_positions(positions, pinned, sources, targets, spacing, seed)
+
+    # the largest step shrinks linearly, from one node spacing
+    for temperature in np.linspace(spacing, spacing / 100, iterations):
+        force = repulsion(positions, moving, spacing) + attraction(positions, moving, sources, targets, length)
+        norm = np.maximum(np.hypot(*force.T), 1e-9)
+        positions[moving] += force / norm[:, None] * np.minimum(norm, temperature)[:, None]
+    return positions
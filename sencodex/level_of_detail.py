@@ -0,0 +1,57 @@
+#Level of detail of the network graph : at low zoom only the major publications
+#(large node_size or many citations) are sent, the others are fetched cell by cell
+#of the spatial grid as the user zooms into a region
+
+import numpy as np
+
+from sencodex.spatial import SpatialIndex
+
+
+class LevelOfDetail:
+
+    def __init__(self, graph_index, min_node_size=45, min_degree=17, detail_zoom=0.35, spatial_index=None):
+        self.graph_index = graph_index
+        self.detail_zoom = detail_zoom
+        self.spatial_index = spatial_index or SpatialIndex(graph_index)
+        self.grid = self.spatial_index.grid
+        is_node = graph_index.is_node
+        is_edge = ~is_node
+        degree = np.bincount(graph_index.source[is_edge], minlength=len(graph_index))
+        degree += np.bincount(graph_index.target[is_edge], minlength=len(graph_index))
+        self.major = is_node & ((graph_index.node_size >= min_node_size) | (degree >= min_degree))
+
+    def cells(self, extent):
+        return self.spatial_index.cells(extent)
+
+    def zoomed_in(self, zoom):
+        return zoom is not None and zoom >= self.detail_zoom
+
+    def selection(self, start, end, zoom=None):
+        # elements of the range drawn at this zoom : only the major nodes and their edges below detail_zoom
+        selection = self.graph_index.range_selection(start, end)
+        if not self.zoomed_in(zoom):
+            selection &= self.major | ~self.graph_index.is_node
+        return selection
+
+    def visible_node_ids(self, extent, zoom, start, end):
+        return self.spatial_index.node_ids(extent, self.selection(start, end, zoom))
+
+    def loaded_nodes(self, start, end, cells):
+        # nodes of the range shown once the given cells are loaded
+        loaded = self.major.copy()
+        loaded[self.grid.cell_rows(cells)] = True
+        return loaded & self.graph_index.range_selection(start, end)
+
+    def _edges_between(self, start, end, loaded):
+        graph_index = self.graph_index
+        edges = ~graph_index.is_node & graph_index.range_selection(start, end)
+        edges[edges] = loaded[graph_index.source[edges]] & loaded[graph_index.target[edges]]
+        return edges
+
+    def overview_selection(self, start, end, cells=()):
+        # major nodes of the range, the nodes of the loaded cells, and the edges between them
+        loaded = self.loaded_nodes(start, end, cells)
+        return loaded | self._edges_between(start, end, loaded)
+
+    def overview(self, start, end, cells=()):
+        return [self.graph_index.elements[position] for position in np.flatnonzero(self.overview_selection(start, end, cells))]
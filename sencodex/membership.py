@@ -0,0 +1,70 @@
+#Sector and document type membership : one boolean mask over the nodes of the graph index
+#per sector and per document type, precomputed once, so that highlighting several sectors
+#within a year range is a combination of masks instead of string matching in the browser
+
+import re
+
+import numpy as np
+
+from sencodex.metrics import phase
+
+
+def sector_segments(secteur):
+    # a publication may belong to several sectors, separated by commas
+    if not isinstance(secteur, str):
+        return ()
+    return tuple(segment.strip() for segment in secteur.split(',') if segment.strip())
+
+
+def matches_sector(segments, sector):
+    # sector values of the dropdown are the start of a word of the sector name
+    # ('consommation' for 'Grande consommation', 'institution' for "Vie de l'institution")
+    pattern = re.compile(r'\b' + re.escape(sector))
+    return any(pattern.search(segment) for segment in segments)
+
+
+class Membership:
+
+    def __init__(self, graph_index):
+        self.graph_index = graph_index
+        self.positions = np.flatnonzero(graph_index.is_node)
+        self.node_ids = np.array([graph_index.keys[position] for position in self.positions], dtype=object)
+        data = [graph_index.elements[position]['data'] for position in self.positions]
+
+        # sector masks are built on first use, the sector values being those of the dropdown
+        self.segments = [sector_segments(node.get('secteur')) for node in data]
+        self.sectors = {}
+        type_docs = [node.get('type_doc') for node in data]
+        self.type_docs = {
+            type_doc: np.array([value == type_doc for value in type_docs], dtype=bool)
+            for type_doc in sorted(set(value for value in type_docs if isinstance(value, str)))
+        }
+
+    def sector_mask(self, sector):
+        mask = self.sectors.get(sector)
+        if mask is None:
+            mask = np.array([matches_sector(segments, sector) for segments in self.segments], dtype=bool)
+            self.sectors[sector] = mask
+        return mask
+
+    def type_doc_mask(self, type_doc):
+        mask = self.type_docs.get(type_doc)
+        if mask is None:
+            return np.zeros(len(self.positions), dtype=bool)
+        return mask
+
+    def selection(self, sectors=(), type_docs=(), start=None, end=None):
+        # nodes in any of the sectors and of any of the document types (no constraint when empty),
+        # within the year range when given
+        mask = np.ones(len(self.positions), dtype=bool)
+        if sectors:
+            mask &= np.logical_or.reduce([self.sector_mask(sector) for sector in sectors])
+        if type_docs:
+            mask &= np.logical_or.reduce([self.type_doc_mask(type_doc) for type_doc in type_docs])
+        if start is not None:
+            mask &= self.graph_index.range_selection(start, end)[self.positions]
+        return mask
+
+    def node_ids_for(self, sectors=(), type_docs=(), start=None, end=None):
+        with phase('membership'):
+            return tuple(sorted(self.node_ids[self.selection(sectors, type_docs, start, end)]))
@@ -0,0 +1,321 @@
+#Instrumentation of the app, off unless SEN_CODEX_METRICS=1 : time spent in the data loaders,
+#in the phases of the callbacks (sencodex modules and front_end_app) and in each callback,
+#request durations and response sizes, and the hits and misses of the caches, exposed in
+#the Prometheus text format on /metrics. When it is off, phase() is a shared null context
+#and nothing is wrapped nor registered on the server.
+#
+#With SEN_CODEX_PROFILE=1 as well, a request sent with the X-Sen-Codex-Profile header set
+#to SEN_CODEX_PROFILE_SECRET (or a SEN_CODEX_PROFILE_RATE fraction of the requests) is
+#profiled by sampling its stack every SEN_CODEX_PROFILE_INTERVAL_MS. Stacks are written in
+#the collapsed format of flame graphs to SEN_CODEX_PROFILE_DIR, which keeps the last
+#SEN_CODEX_PROFILE_KEEP files.
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+import functools
+import hmac
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from sencodex.cache import private_directory
+
+ENABLED = os.environ.get('SEN_CODEX_METRICS') == '1'
+
+PROFILE = ENABLED and os.environ.get('SEN_CODEX_PROFILE') == '1'
+PROFILE_RATE = float(os.environ.get('SEN_CODEX_PROFILE_RATE', 0))
+PROFILE_INTERVAL = float(os.environ.get('SEN_CODEX_PROFILE_INTERVAL_MS', 1)) / 1000
+PROFILE_DIR = os.environ.get('SEN_CODEX_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'sen-codex-profiles'))
+PROFILE_KEEP = int(os.environ.get('SEN_CODEX_PROFILE_KEEP', 100))
+# without a secret, the header is ignored
+PROFILE_SECRET = os.environ.get('SEN_CODEX_PROFILE_SECRET', '')
+PROFILE_HEADER = 'X-Sen-Codex-Profile'
+
+# seconds, from 0.1 ms to 10 s
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+# bytes, from 1 KiB to 16 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(8))
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    # cumulative buckets, sum and count per value of a single label
+
+    def __init__(self, name, description, label, buckets=TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {label_value: (list(counts), total, count)
+                      for label_value, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{{{label},le="{bound}"}} {bucket_count}'
+            yield f'{self.name}_bucket{{{label},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{label}}} {total}"
+            yield f"{self.name}_count{{{label}}} {count}"
+
+
+class CounterMetric:
+
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] += amount
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            yield f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}'
+
+
+PHASE_SECONDS = Histogram('sen_codex_phase_seconds', "Time spent in a phase of the data loaders or callbacks", 'phase')
+CALLBACK_SECONDS = Histogram('sen_codex_callback_seconds', "Time spent in a callback function, without the JSON "
+                             "serialization by Dash", 'callback')
+CALLBACK_ERRORS = CounterMetric('sen_codex_callback_errors_total', "Callbacks that raised an exception", 'callback')
+REQUEST_SECONDS = Histogram('sen_codex_request_seconds', "Duration of the requests, per callback or route", 'endpoint')
+RESPONSE_BYTES = Histogram('sen_codex_response_bytes', "Size of the response bodies as sent, per callback or route",
+                           'endpoint', SIZE_BUCKETS)
+
+# name -> cache (sencodex/cache.py), read at each scrape
+CACHES = {}
+
+
+def observe_phase(name, seconds):
+    if ENABLED:
+        PHASE_SECONDS.observe(name, seconds)
+
+
+@contextmanager
+def _timed_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(name, time.perf_counter() - started)
+
+
+def phase(name):
+    # with phase('stylesheet'): ... times the block when the instrumentation is on
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _timed_phase(name)
+
+
+def register_cache(name, cache):
+    CACHES[name] = cache
+
+
+def _cache_tiers(name, cache):
+    # (cache, tier, hits, misses, entries, bytes) of a cache, and of both tiers of a TieredCache
+    if hasattr(cache, 'local') and hasattr(cache, 'shared'):
+        yield from _cache_tiers(name, cache.local)
+        for tier in _cache_tiers(name, cache.shared):
+            yield tier[0], 'shared', *tier[2:]
+        return
+    entries = len(cache) if hasattr(cache, '__len__') else None
+    yield name, 'local', cache.hits, cache.misses, entries, getattr(cache, 'size', None)
+
+
+def cache_lines():
+    tiers = [tier for name, cache in sorted(CACHES.items()) for tier in _cache_tiers(name, cache)]
+    for metric, kind, index, description in (
+        ('sen_codex_cache_hits_total', 'counter', 2, "Lookups answered by a cache"),
+        ('sen_codex_cache_misses_total', 'counter', 3, "Lookups missed by a cache"),
+        ('sen_codex_cache_entries', 'gauge', 4, "Entries held by a cache"),
+        ('sen_codex_cache_size', 'gauge', 5, "Size held by a cache : bytes for the responses, entries for the others"),
+    ):
+        yield f"# HELP {metric} {description}"
+        yield f"# TYPE {metric} {kind}"
+        for tier in tiers:
+            if tier[index] is not None:
+                yield f'{metric}{{cache="{_escape(tier[0])}",tier="{tier[1]}"}} {tier[index]}'
+
+
+def exposition():
+    lines = []
+    for metric in (PHASE_SECONDS, CALLBACK_SECONDS, CALLBACK_ERRORS, REQUEST_SECONDS, RESPONSE_BYTES):
+        lines.extend(metric.lines())
+    lines.extend(cache_lines())
+    return '\n'.join(lines) + '\n'
+
+
+#Callbacks
+
+def instrument_callbacks(app):
+    # times the functions of the callbacks registered from now on with app.callback
+    from dash.exceptions import PreventUpdate
+
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(function):
+            @functools.wraps(function)
+            def timed_function(*function_args, **function_kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*function_args, **function_kwargs)
+                except PreventUpdate:
+                    raise
+                except Exception:
+                    CALLBACK_ERRORS.inc(function.__name__)
+                    raise
+                finally:
+                    CALLBACK_SECONDS.observe(function.__name__, time.perf_counter() - started)
+            return decorator(timed_function)
+        return wrap
+
+    app.callback = callback
+
+
+#Sampling profiler
+
+class SamplingProfiler:
+    # samples the stack of a thread from another thread, counting the collapsed stacks
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def write(self, path, keep=PROFILE_KEEP):
+        # the keep most recent profiles of the directory are kept
+        directory = private_directory(os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        profiles = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.folded'):
+                try:
+                    profiles.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        for _, old_path in sorted(profiles)[:max(len(profiles) - keep, 0)]:
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        return path
+
+
+#Server
+
+def _endpoint(app, request):
+    # callback name of the Dash updates, route name of the other requests
+    if request.path.endswith('/_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        callback = app.callback_map.get(body.get('output'), {}).get('callback')
+        return getattr(callback, '__name__', 'unknown callback')
+    return request.endpoint or 'not found'
+
+
+def profile_requested(value):
+    # header value of a request, compared in constant time with the secret
+    return bool(PROFILE_SECRET) and value is not None and hmac.compare_digest(
+        value.encode('utf-8'), PROFILE_SECRET.encode('utf-8'))
+
+
+def register_metrics(server, app):
+    # to be registered before the compression (sencodex/compression.py) : after_request
+    # functions run in reverse order, so that the sizes are those of the compressed bodies
+    from flask import Response, g, request
+
+    @server.before_request
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        if PROFILE and (profile_requested(request.headers.get(PROFILE_HEADER)) or random.random() < PROFILE_RATE):
+            g.metrics_profiler = SamplingProfiler(threading.get_ident()).start()
+
+    @server.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.path == '/metrics':
+            return response
+        endpoint = _endpoint(app, request)
+        REQUEST_SECONDS.observe(endpoint, time.perf_counter() - started)
+        if not response.direct_passthrough and not response.is_streamed:
+            RESPONSE_BYTES.observe(endpoint, response.content_length or 0)
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            # endpoints such as / are not file names
+            name = re.sub(r'[^\w.-]+', '_', endpoint).strip('_') or 'index'
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}-"
+                                             f"{name}.folded")
+            response.headers[PROFILE_HEADER] = os.path.basename(profiler.write(path))
+        return response
+
+    @server.teardown_request
+    def stop_profiler(exception=None):
+        # requests that failed before their response
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+
+    def metrics():
+        return Response(exposition(), mimetype='text/plain; version=0.0.4')
+
+    server.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,50 @@
+#Element payloads of the range slider, served by Flask outside of the Dash callbacks
+#
+#    /graph/elements.json?start=12&end=15
+#
+#The payloads are serialized and compressed once per range (sencodex/responses.py) and
+#sent in the best content coding the browser accepts, with an ETag of the data version
+#and the range so that browsers revalidate them instead of downloading them again.
+
+from flask import Response, abort, request
+
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.compression import accepted_encoding
+from sencodex.data import get_data_version, get_range_responses
+
+
+def elements_url(start, end):
+    return f"/graph/elements.json?start={start}&end={end}"
+
+
+def _year_range(args):
+    try:
+        start = int(args.get('start', FIRST_YEAR))
+        end = int(args.get('end', LAST_YEAR))
+    except ValueError:
+        abort(400, "start and end must be slider values (9 for 2009, ..., 21 for 2021)")
+    if not FIRST_YEAR <= start <= end <= LAST_YEAR:
+        abort(400, f"start and end must be slider values, with {FIRST_YEAR} <= start <= end <= {LAST_YEAR}")
+    return start, end
+
+
+def range_elements():
+    start, end = _year_range(request.args)
+    response = get_range_responses().get(start, end)
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'), tuple(response.encoded))
+    # one representation per content coding
+    etag = f"{get_data_version()}-{start}-{end}-{encoding or 'identity'}"
+    if etag in request.if_none_match:
+        flask_response = Response(status=304)
+    else:
+        flask_response = Response(response.body(encoding), mimetype='application/json')
+        if encoding:
+            flask_response.headers['Content-Encoding'] = encoding
+    flask_response.set_etag(etag)
+    flask_response.vary.add('Accept-Encoding')
+    flask_response.cache_control.no_cache = True
+    return flask_response
+
+
+def register_payload_routes(server):
+    server.add_url_rule('/graph/elements.json', 'range_elements', range_elements)
@@ -0,0 +1,390 @@
+#Build pipeline of the graph artifacts : the yearly snapshots elements_m1_N.dat and the
+#full graph elements_m1.dat, rebuilt from the citation table and the publication metadata.
+#
+#A yearly snapshot holds the citations made by the publications of that year and the
+#publications at both ends. Positions and sizes come from the metadata, publications
+#missing from it are placed by an incremental layout around the pinned ones. The completed
+#metadata is written to the output directory, where the next builds read the positions of the
+#publications they placed, so that they keep them. Years are built
+#in a process pool, and only those whose inputs changed since the last build (see the
+#manifest of the output directory) unless --force is given.
+#
+#    python -m sencodex.pipeline extract                 metadata of the current graph -> static/publications.csv
+#    python -m sencodex.pipeline build [--store]         -> build/graph
+#    python -m sencodex.pipeline verify                  compare build/graph with static
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import hashlib
+import json
+import os
+import pickle
+import sys
+import warnings
+
+import blosc
+import numpy as np
+
+from sencodex import STATIC_DIR, FIRST_YEAR, LAST_YEAR, publication_year, slider_value
+from sencodex.adjacency import QUOTES
+from sencodex.graph_index import element_key, load_dat
+from sencodex.graph_store import NULLABLE_COLUMNS
+from sencodex.layout import incremental_layout
+
+CITATIONS_CSV = os.path.join(STATIC_DIR, 'export_graph_1309.csv')
+PUBLICATIONS_CSV = os.path.join(STATIC_DIR, 'publications.csv')
+BUILD_DIR = os.path.join(os.path.dirname(STATIC_DIR), 'build', 'graph')
+MANIFEST = 'manifest.json'
+# completed metadata, in the output directory
+PLACED_METADATA = 'publications.csv'
+
+#Columns of the publication metadata, in the order of the node data
+
+DETAIL_COLUMNS = ['datetime', 'type_doc', 'secteur', 'titre', 'Pages vues']
+METADATA_COLUMNS = ['id', 'label'] + DETAIL_COLUMNS + ['node_size', 'x', 'y']
+
+#Size of the publications missing from the metadata : the size of a publication without page views
+
+MIN_NODE_SIZE = 31
+MAX_NODE_SIZE = 112
+
+
+def snapshot_name(year=None):
+    return 'elements_m1.dat' if year is None else f'elements_m1_{year}.dat'
+
+
+def write_dat(path, elements):
+    # same format as the published snapshots : blosc compressed pickle
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(blosc.compress(pickle.dumps(elements), typesize=8))
+    os.replace(tmp_path, path)
+
+
+def snapshot_year(publication_id):
+    # slider value of the year of a citing publication, which names its yearly snapshot
+    year = publication_year(publication_id)
+    if year is None:
+        raise ValueError(f"{publication_id} does not start with the two digits of its year")
+    return slider_value(year)
+
+
+#Inputs
+
+def extract_metadata(path=PUBLICATIONS_CSV):
+    # publication metadata of the current graph (sencodex/graph_store.py), as the pipeline input
+    from sencodex.graph_store import GraphStore
+
+    metadata = {
+        element['data']['id']: {'data': element['data'], 'position': [element['position']['x'], element['position']['y']]}
+        for element in GraphStore().node_elements()
+    }
+    return write_metadata(metadata, path)
+
+
+def write_metadata(metadata, path=PUBLICATIONS_CSV):
+    # publication id -> node data and position, as read by read_metadata
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=METADATA_COLUMNS)
+        writer.writeheader()
+        for publication_id in sorted(metadata):
+            row = dict(metadata[publication_id]['data'])
+            if 'datetime' in row and row['secteur'] is None:
+                row['secteur'] = ''
+            position = metadata[publication_id]['position']
+            if position is not None:
+                row['x'] = repr(float(position[0]))
+                row['y'] = repr(float(position[1]))
+            writer.writerow(row)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metadata(path=PUBLICATIONS_CSV):
+    # publication id -> node data and position. Publications without a date only have
+    # an id, a label and a size, and a missing sector is None
+    metadata = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            data = {'id': row['id'], 'label': row['label'] or row['id']}
+            if row['datetime']:
+                data['datetime'] = row['datetime']
+                data['type_doc'] = row['type_doc']
+                data['secteur'] = row['secteur'] or None
+                data['titre'] = row['titre']
+                data['Pages vues'] = int(row['Pages vues'] or 0)
+            data['node_size'] = int(row['node_size']) if row['node_size'] else None
+            position = [float(row['x']), float(row['y'])] if row['x'] and row['y'] else None
+            metadata[row['id']] = {'data': data, 'position': position}
+    return metadata
+
+
+def read_citations(path=CITATIONS_CSV):
+    # (citing, cited) -> number of citations. The table lists each citation twice,
+    # from both ends : the first row of a pair is kept
+    import pandas as pd
+
+    table = pd.read_csv(path)
+    citations = {}
+    for a, b, number, relation in zip(table['Publication A'], table['Publication B'], table['Number'],
+                                      table['Publication A xx Publication B']):
+        pair = (a, b) if relation == QUOTES else (b, a)
+        citations.setdefault(pair, int(number))
+    return citations
+
+
+#Layout and sizes
+
+def node_size(pages, max_pages):
+    # square root of the page views, between MIN_NODE_SIZE and MAX_NODE_SIZE
+    if not max_pages:
+        return MIN_NODE_SIZE
+    return int(MIN_NODE_SIZE + (MAX_NODE_SIZE - MIN_NODE_SIZE) * np.sqrt(pages / max_pages))
+
+
+def complete_metadata(metadata, citations):
+    # metadata of every publication of the citations : sizes from the page views when missing,
+    # publications without position placed among the others
+    metadata = {publication_id: {'data': dict(row['data']), 'position': row['position']}
+                for publication_id, row in metadata.items()}
+    for pair in citations:
+        for publication_id in pair:
+            if publication_id not in metadata:
+                metadata[publication_id] = {'data': {'id': publication_id, 'label': publication_id, 'node_size': None},
+                                            'position': None}
+
+    max_pages = max((row['data'].get('Pages vues', 0) for row in metadata.values()), default=0)
+    for row in metadata.values():
+        if row['data']['node_size'] is None:
+            row['data']['node_size'] = node_size(row['data'].get('Pages vues', 0), max_pages)
+
+    # publications already placed keep their position (sencodex/layout.py)
+    publication_ids = sorted(metadata)
+    rows = {publication_id: row for row, publication_id in enumerate(publication_ids)}
+    pinned = np.array([metadata[publication_id]['position'] is not None for publication_id in publication_ids])
+    if not pinned.all():
+        positions = np.array([metadata[publication_id]['position'] or [0.0, 0.0] for publication_id in publication_ids])
+        sources = np.array([rows[citing] for citing, _ in citations], dtype=np.int64)
+        targets = np.array([rows[cited] for _, cited in citations], dtype=np.int64)
+        positions = incremental_layout(positions, pinned, sources, targets)
+        for row in np.flatnonzero(~pinned):
+            metadata[publication_ids[row]]['position'] = positions[row].tolist()
+    return metadata
+
+
+#Partitions
+
+def citation_years(citations):
+    # years of the citing publications of the table, from the first to the last one
+    years = {snapshot_year(citing) for citing, _ in citations}
+    return list(range(min(years), max(years) + 1)) if years else []
+
+
+def partitions(citations, metadata):
+    # inputs of each yearly snapshot : its citations and the metadata of their publications
+    years = {year: {'citations': [], 'publications': {}} for year in citation_years(citations)}
+    for (citing, cited), number in sorted(citations.items()):
+        partition = years[snapshot_year(citing)]
+        partition['citations'].append([citing, cited, number])
+        for publication_id in (citing, cited):
+            partition['publications'][publication_id] = metadata[publication_id]
+    return years
+
+
+def partition_digest(partition):
+    return hashlib.sha1(json.dumps(partition, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def partition_elements(partition):
+    # nodes sorted by id, then edges sorted by (source, target)
+    elements = []
+    for publication_id in sorted(partition['publications']):
+        row = partition['publications'][publication_id]
+        elements.append({
+            'data': dict(row['data']),
+            'position': {'x': np.float64(row['position'][0]), 'y': np.float64(row['position'][1])},
+        })
+    for citing, cited, number in partition['citations']:
+        elements.append({'data': {'source': citing, 'target': cited, 'cited_occurences': number}})
+    return elements
+
+
+def build_partition(task):
+    # run in a worker process
+    year, partition, path = task
+    write_dat(path, partition_elements(partition))
+    return year
+
+
+def full_partition(years):
+    merged = {'citations': [], 'publications': {}}
+    for partition in years.values():
+        merged['citations'].extend(partition['citations'])
+        merged['publications'].update(partition['publications'])
+    merged['citations'].sort()
+    return merged
+
+
+def build(output_dir=BUILD_DIR, csv_path=CITATIONS_CSV, metadata_path=PUBLICATIONS_CSV, workers=None, force=False,
+          store=False):
+    # build the snapshots whose inputs changed, returns the names of the files written
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    citations = read_citations(csv_path)
+    known = read_metadata(metadata_path)
+    # publications placed by a former build keep their position, unless the metadata gives one
+    placed_path = os.path.join(output_dir, PLACED_METADATA)
+    if os.path.exists(placed_path):
+        for publication_id, row in read_metadata(placed_path).items():
+            if publication_id not in known or known[publication_id]['position'] is None:
+                known[publication_id] = row
+    metadata = complete_metadata(known, citations)
+    placed = [publication_id for publication_id in metadata
+              if publication_id not in known or known[publication_id]['position'] is None]
+    years = partitions(citations, metadata)
+    outside = [str(year) for year in years if not FIRST_YEAR <= year <= LAST_YEAR]
+    if outside:
+        warnings.warn(f"years {', '.join(outside)} are built but outside the range slider ({FIRST_YEAR} to "
+                      f"{LAST_YEAR}, sencodex/__init__.py)")
+
+    digests = {str(year): partition_digest(partition) for year, partition in years.items()}
+    tasks = []
+    for year, partition in years.items():
+        path = os.path.join(output_dir, snapshot_name(year))
+        if manifest.get(str(year)) != digests[str(year)] or not os.path.exists(path):
+            tasks.append((year, partition, path))
+    written = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for year in executor.map(build_partition, tasks):
+                written.append(snapshot_name(year))
+
+    full_path = os.path.join(output_dir, snapshot_name())
+    digests['full'] = hashlib.sha1(''.join(digests[str(year)] for year in sorted(years)).encode('utf-8')).hexdigest()
+    if manifest.get('full') != digests['full'] or not os.path.exists(full_path):
+        write_dat(full_path, partition_elements(full_partition(years)))
+        written.append(snapshot_name())
+
+    if store and written:
+        from sencodex.graph_store import convert_dat_files
+        convert_dat_files(output_dir)
+        written.append('graph_m1.store')
+
+    if placed:
+        write_metadata(metadata, placed_path)
+        written.append(PLACED_METADATA)
+
+    with open(manifest_path, 'w') as f:
+        json.dump(digests, f, indent=1, sort_keys=True)
+    return written
+
+
+#Verification
+
+def node_data(element):
+    # a missing sector is NaN in the published snapshots and None in the built ones, None for
+    # both as in sencodex/graph_store.py
+    data = dict(element['data'])
+    for column in NULLABLE_COLUMNS:
+        if column in data and not isinstance(data[column], str):
+            data[column] = None
+    return data
+
+
+def snapshot_years(directory):
+    # years of the yearly snapshots of a directory
+    years = set()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            year = name[len('elements_m1_'):-len('.dat')]
+            if name.startswith('elements_m1_') and name.endswith('.dat') and year.isdigit():
+                years.add(int(year))
+    return years
+
+
+def compare_snapshots(elements, reference):
+    # differences between two snapshots, as counts
+    def index(snapshot):
+        return {element_key(element): element for element in snapshot}
+
+    built, expected = index(elements), index(reference)
+    nodes = {key for key in built if isinstance(key, str)}, {key for key in expected if isinstance(key, str)}
+    edges = {key for key in built if isinstance(key, tuple)}, {key for key in expected if isinstance(key, tuple)}
+    common_nodes = nodes[0] & nodes[1]
+    common_edges = edges[0] & edges[1]
+    return {
+        'missing nodes': len(nodes[1] - nodes[0]),
+        'extra nodes': len(nodes[0] - nodes[1]),
+        'missing edges': len(edges[1] - edges[0]),
+        'extra edges': len(edges[0] - edges[1]),
+        'node data': sum(node_data(built[key]) != node_data(expected[key]) for key in common_nodes),
+        'positions': sum(
+            not np.isclose(built[key]['position']['x'], expected[key]['position']['x'])
+            or not np.isclose(built[key]['position']['y'], expected[key]['position']['y'])
+            for key in common_nodes
+        ),
+        'edge data': sum(built[key]['data'] != expected[key]['data'] for key in common_edges),
+    }
+
+
+def verify(output_dir=BUILD_DIR, reference_dir=STATIC_DIR):
+    # differences of each built snapshot with the reference one
+    report = {}
+    for year in [None] + sorted(snapshot_years(output_dir) | snapshot_years(reference_dir)):
+        name = snapshot_name(year)
+        built_path, reference_path = os.path.join(output_dir, name), os.path.join(reference_dir, name)
+        if not os.path.exists(built_path) or not os.path.exists(reference_path):
+            report[name] = None
+            continue
+        report[name] = compare_snapshots(load_dat(built_path), load_dat(reference_path))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sencodex.pipeline', description="Build the graph artifacts")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = commands.add_parser('extract', help="write the publication metadata of the current graph")
+    extract_parser.add_argument('--output', default=PUBLICATIONS_CSV)
+
+    build_parser = commands.add_parser('build', help="build the snapshots whose inputs changed")
+    build_parser.add_argument('--output', default=BUILD_DIR)
+    build_parser.add_argument('--citations', default=CITATIONS_CSV)
+    build_parser.add_argument('--metadata', default=PUBLICATIONS_CSV)
+    build_parser.add_argument('--workers', type=int, default=None)
+    build_parser.add_argument('--force', action='store_true', help="rebuild every snapshot")
+    build_parser.add_argument('--store', action='store_true', help="also write graph_m1.store")
+
+    verify_parser = commands.add_parser('verify', help="compare the built snapshots with the reference ones")
+    verify_parser.add_argument('--output', default=BUILD_DIR)
+    verify_parser.add_argument('--reference', default=STATIC_DIR)
+
+    args = parser.parse_args(argv)
+    if args.command == 'extract':
+        print(extract_metadata(args.output))
+    elif args.command == 'build':
+        written = build(args.output, args.citations, args.metadata, args.workers, args.force, args.store)
+        print(f"{len(written)} file(s) written in {args.output}" + (" : " + ", ".join(written) if written else ""))
+    else:
+        differences = 0
+        for name, counts in verify(args.output, args.reference).items():
+            if counts is None:
+                print(f"{name}: missing")
+                differences += 1
+                continue
+            changes = {key: count for key, count in counts.items() if count}
+            differences += bool(changes)
+            print(f"{name}: " + (", ".join(f"{count} {key}" for key, count in changes.items()) if changes else "identical"))
+        return 1 if differences else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
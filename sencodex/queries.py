@@ -0,0 +1,102 @@
+#Citation queries : shortest citation path between two publications, k-hop ancestors
+#(publications transitively quoted) and descendants (publications transitively quoting),
+#and reachable counts. Breadth-first searches run on the integer codes and CSR arrays
+#of the adjacency, one array frontier per hop, and results are cached per query.
+
+import numpy as np
+
+from sencodex.adjacency import gather
+from sencodex.cache import LRUCache
+from sencodex.metrics import phase
+
+#Query modes of the publication filter
+
+ANCESTORS = 'ancestors'
+DESCENDANTS = 'descendants'
+PATH = 'path'
+
+DIRECTIONS = {ANCESTORS: 'out', DESCENDANTS: 'in'}
+
+
+def expand(indptr, indices, frontier):
+    # neighbours of the frontier, with the frontier node each of them was reached from
+    counts = indptr[frontier + 1] - indptr[frontier]
+    return gather(indptr, indices, frontier), np.repeat(frontier, counts)
+
+
+class CitationQueries:
+
+    def __init__(self, adjacency, max_entries=1024):
+        self.adjacency = adjacency
+        self.cache = LRUCache(max_entries=max_entries)
+
+    def _cached(self, key, compute):
+        result = self.cache.get(key)
+        if result is None:
+            with phase('query'):
+                result = compute()
+            self.cache.set(key, result)
+        return result
+
+    def relatives(self, publication_ids, mode, hops=None):
+        # publications within hops citations of any of publication_ids (a tuple, or a single id),
+        # all of them if hops is None, following citations forwards (ancestors) or backwards (descendants)
+        if isinstance(publication_ids, str):
+            publication_ids = (publication_ids,)
+
+        def compute():
+            frontiers = self.adjacency.frontiers(publication_ids, hops, DIRECTIONS[mode])
+            if not frontiers:
+                return ()
+            return self.adjacency.decode(np.sort(np.concatenate(frontiers)))
+        return self._cached((mode, tuple(publication_ids), hops), compute)
+
+    def ancestors(self, publication_ids, hops=None):
+        return self.relatives(publication_ids, ANCESTORS, hops)
+
+    def descendants(self, publication_ids, hops=None):
+        return self.relatives(publication_ids, DESCENDANTS, hops)
+
+    def reachable_counts(self, publication_ids):
+        # number of publications transitively quoted by and quoting publication_ids
+        return len(self.ancestors(publication_ids)), len(self.descendants(publication_ids))
+
+    def _directed_path(self, source, target, max_hops=None):
+        # codes of the shortest chain of citations from source to target, or None
+        adjacency = self.adjacency
+        parents = np.full(len(adjacency), -1, dtype=np.int64)
+        parents[source] = source
+        frontier = np.array([source], dtype=np.int64)
+        hops = 0
+        while len(frontier) and parents[target] < 0 and (max_hops is None or hops < max_hops):
+            reached, origins = expand(adjacency.out_indptr, adjacency.out_indices, frontier)
+            new = parents[reached] < 0
+            # first parent of each newly reached node
+            frontier, first = np.unique(reached[new], return_index=True)
+            parents[frontier] = origins[new][first]
+            hops += 1
+        if parents[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parents[path[-1]]))
+        return path[::-1]
+
+    def shortest_path(self, source_id, target_id, max_hops=None):
+        # shortest chain of citations between two publications, in whichever direction exists
+        # (source quoting ... target, or target quoting ... source), as a tuple of ids
+        def compute():
+            codes = self.adjacency.codes
+            if source_id not in codes or target_id not in codes:
+                return ()
+            source, target = codes[source_id], codes[target_id]
+            path = self._directed_path(source, target, max_hops)
+            if path is None:
+                path = self._directed_path(target, source, max_hops)
+            return self.adjacency.decode(path) if path else ()
+        return self._cached((PATH, source_id, target_id, max_hops), compute)
+
+
+def path_edges(path):
+    # (citing, cited) pairs along a path, whichever its direction
+    return tuple(zip(path[:-1], path[1:]))
@@ -0,0 +1,109 @@
+#Memoized responses of the range slider : one entry per [start, end] pair,
+#holding the positions of its elements, their serialized JSON payload (orjson when it is
+#installed) and the payload in every content coding (sencodex/compression.py). Responses
+#only hold arrays and bytes, stored as such by the shared caches (sencodex/cache.py).
+
+import json
+import struct
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.cache import Codec, LRUCache
+from sencodex.compression import ENCODINGS, compress
+from sencodex.metrics import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def serialize(elements):
+    if orjson is not None:
+        return orjson.dumps(elements, option=orjson.OPT_SERIALIZE_NUMPY)
+    return to_json_plotly(elements).encode('utf-8')
+
+
+class RangeResponse:
+
+    def __init__(self, positions, payload, encoded=None):
+        self.positions = positions
+        self.payload = payload
+        # content coding -> compressed payload
+        self.encoded = encoded if encoded is not None else {}
+
+    @classmethod
+    def build(cls, graph_index, positions):
+        positions = positions.astype(np.int32)
+        with phase('elements'):
+            elements = [graph_index.elements[position] for position in positions]
+        with phase('serialization'):
+            payload = serialize(elements)
+        with phase('compression'):
+            encoded = {encoding: compress(payload, encoding) for encoding in ENCODINGS}
+        return cls(positions, payload, encoded)
+
+    @property
+    def size(self):
+        return len(self.payload) + sum(len(data) for data in self.encoded.values()) + self.positions.nbytes
+
+    def body(self, encoding=None):
+        # payload in one of the computed content codings, as it is for None
+        return self.encoded[encoding] if encoding else self.payload
+
+    def dumps(self):
+        # length of a JSON header giving the lengths of the parts, the header, then the positions
+        # (little-endian int32), the payload and the compressed payloads
+        encodings = sorted(self.encoded)
+        parts = [self.positions.astype('<i4').tobytes(), self.payload] + [self.encoded[encoding] for encoding in encodings]
+        header = json.dumps({'encodings': encodings, 'lengths': [len(part) for part in parts]}).encode('utf-8')
+        return struct.pack('<I', len(header)) + header + b''.join(parts)
+
+    @classmethod
+    def loads(cls, data):
+        if len(data) < 4:
+            raise ValueError("truncated range response")
+        header_length, = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + header_length].decode('utf-8'))
+        offset = 4 + header_length
+        parts = []
+        for length in header['lengths']:
+            parts.append(data[offset:offset + length])
+            offset += length
+        if offset != len(data) or len(parts) != len(header['encodings']) + 2:
+            raise ValueError("truncated range response")
+        positions = np.frombuffer(parts[0], dtype='<i4').astype(np.int32)
+        return cls(positions, parts[1], dict(zip(header['encodings'], parts[2:])))
+
+
+RANGE_CODEC = Codec(RangeResponse.dumps, RangeResponse.loads)
+
+
+class RangeResponses:
+
+    def __init__(self, graph_index, cache=None):
+        self.graph_index = graph_index
+        self.cache = cache if cache is not None else LRUCache()
+
+    def get(self, start, end):
+        key = (start, end)
+        response = self.cache.get(key)
+        if response is None:
+            response = RangeResponse.build(self.graph_index, np.flatnonzero(self.graph_index.range_selection(start, end)))
+            self.cache.set(key, response, size=response.size)
+        return response
+
+    def elements(self, start, end):
+        # materialized on demand, only the payload is kept
+        positions = self.get(start, end).positions
+        elements = self.graph_index.elements
+        with phase('elements'):
+            return [elements[position] for position in positions]
+
+    def warm_up(self):
+        # the slider has one mark per year, so there are only 91 possible ranges
+        for start in range(FIRST_YEAR, LAST_YEAR + 1):
+            for end in range(start, LAST_YEAR + 1):
+                self.get(start, end)
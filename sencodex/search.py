@@ -0,0 +1,121 @@
+#Search index of the publication dropdowns : publication ids, titles and sectors, searched
+#on the server through a trigram inverted index, so that the page does not ship the whole
+#list of options and titles become searchable
+
+from collections import defaultdict
+import re
+import unicodedata
+
+import numpy as np
+
+from sencodex import publication_year
+
+TITLE_LENGTH = 80
+
+
+def normalize(text):
+    # lower case, without accents, typographic apostrophes nor repeated spaces
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return re.sub(r'\s+', ' ', text.replace('’', "'").lower()).strip()
+
+
+def recency(publication_id):
+    # ids without a year last
+    return publication_year(publication_id) or 0, publication_id
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+
+    def __init__(self, publication_ids, titles=None, sectors=None):
+        titles = titles or {}
+        sectors = sectors or {}
+        # most recent publications first, as in the former option list
+        self.ids = sorted(publication_ids, key=recency, reverse=True)
+        self.codes = {publication_id: code for code, publication_id in enumerate(self.ids)}
+        self.titles = [titles.get(publication_id) or '' for publication_id in self.ids]
+        self.sectors = [sectors.get(publication_id) or '' for publication_id in self.ids]
+        self.normalized_ids = [normalize(publication_id) for publication_id in self.ids]
+        self.texts = [
+            ' '.join([normalize(publication_id), normalize(titles.get(publication_id)),
+                      normalize(sectors.get(publication_id))])
+            for publication_id in self.ids
+        ]
+
+        postings = defaultdict(list)
+        for code, text in enumerate(self.texts):
+            for trigram in trigrams(text):
+                postings[trigram].append(code)
+        self.postings = {trigram: np.array(codes, dtype=np.int32) for trigram, codes in postings.items()}
+
+    @classmethod
+    def from_graph(cls, graph_index, publication_ids=()):
+        # publications of the graph with their title and sector, completed with publication_ids
+        titles = {}
+        sectors = {}
+        for key, element in zip(graph_index.keys, graph_index.elements):
+            if isinstance(key, str):
+                titles[key] = element['data'].get('titre')
+                sectors[key] = element['data'].get('secteur')
+        return cls(set(titles) | set(publication_ids), titles, sectors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _candidates(self, token):
+        # codes of the publications whose text contains token
+        if len(token) < 3:
+            return np.array([code for code, text in enumerate(self.texts) if token in text], dtype=np.int32)
+        postings = [self.postings.get(trigram) for trigram in trigrams(token)]
+        if any(codes is None for codes in postings):
+            return np.empty(0, dtype=np.int32)
+        # intersect the shortest posting lists first
+        postings.sort(key=len)
+        codes = postings[0]
+        for other in postings[1:]:
+            codes = np.intersect1d(codes, other, assume_unique=True)
+        # the trigrams can all be present without the token itself
+        return np.array([code for code in codes if token in self.texts[code]], dtype=np.int32)
+
+    def search(self, query, limit=20):
+        # ids of the best matches of every word of query : the id itself, then ids starting
+        # with the query, then the other matches, most recent first within each group
+        query = normalize(query)
+        if not query:
+            return []
+        codes = None
+        for token in query.split(' '):
+            candidates = self._candidates(token)
+            codes = candidates if codes is None else np.intersect1d(codes, candidates, assume_unique=True)
+            if len(codes) == 0:
+                return []
+        ranks = np.array([
+            0 if self.normalized_ids[code] == query else 1 if self.normalized_ids[code].startswith(query) else 2
+            for code in codes
+        ])
+        order = np.lexsort((codes, ranks))[:limit]
+        return [self.ids[code] for code in codes[order]]
+
+    def option(self, publication_id):
+        # dropdown option of a publication, labelled with the start of its title. The dropdown
+        # filters the options it receives again : 'search' lets it find what the index matched
+        code = self.codes.get(publication_id)
+        if code is None:
+            return {'label': publication_id, 'value': publication_id}
+        title = self.titles[code]
+        label = title if len(title) <= TITLE_LENGTH else title[:TITLE_LENGTH - 1].rstrip() + '…'
+        return {
+            'label': f"{publication_id} : {label}" if label else publication_id,
+            'value': publication_id,
+            'search': ' '.join([publication_id, title, self.sectors[code], self.texts[code]]),
+        }
+
+    def options(self, query, selected=(), limit=20):
+        # options matching query, after the selected values that must stay among the options
+        selected = [publication_id for publication_id in selected if publication_id]
+        matches = [publication_id for publication_id in self.search(query, limit) if publication_id not in selected]
+        return [self.option(publication_id) for publication_id in selected + matches]
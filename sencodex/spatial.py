@@ -0,0 +1,114 @@
+#Spatial index over the preset positions of the nodes : a uniform grid whose cells
+#list the nodes they contain, stored as CSR arrays
+
+import numpy as np
+
+from sencodex.adjacency import gather
+
+
+class GridIndex:
+
+    def __init__(self, x, y, rows, cells_per_side=32):
+        # rows : identifiers of the points (x[i], y[i]), returned by the queries
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cells_per_side = cells_per_side
+        self.x0 = float(x.min()) if len(x) else 0.0
+        self.y0 = float(y.min()) if len(y) else 0.0
+        span = max(float(x.max()) - self.x0, float(y.max()) - self.y0, 1.0) if len(x) else 1.0
+        self.cell_size = span / cells_per_side
+
+        columns = self._clip((x - self.x0) // self.cell_size)
+        lines = self._clip((y - self.y0) // self.cell_size)
+        cells = columns * cells_per_side + lines
+        order = np.argsort(cells, kind='stable')
+        self.indptr = np.zeros(cells_per_side * cells_per_side + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=cells_per_side * cells_per_side), out=self.indptr[1:])
+        self.indices = self.rows[order]
+
+    def _clip(self, values):
+        return np.clip(np.asarray(values, dtype=np.int64), 0, self.cells_per_side - 1)
+
+    def coordinates(self, x, y):
+        # column and line of the cells of the points (x, y), clipped to the grid
+        return (self._clip((np.asarray(x) - self.x0) // self.cell_size),
+                self._clip((np.asarray(y) - self.y0) // self.cell_size))
+
+    def cells(self, x1, y1, x2, y2):
+        # cells overlapping the rectangle, sorted
+        columns = np.arange(*self._clip([(min(x1, x2) - self.x0) // self.cell_size,
+                                          (max(x1, x2) - self.x0) // self.cell_size]) + [0, 1])
+        lines = np.arange(*self._clip([(min(y1, y2) - self.y0) // self.cell_size,
+                                        (max(y1, y2) - self.y0) // self.cell_size]) + [0, 1])
+        return (columns[:, None] * self.cells_per_side + lines[None, :]).ravel()
+
+    def cell_rows(self, cells):
+        return gather(self.indptr, self.indices, np.asarray(cells, dtype=np.int64))
+
+
+def segments_in_rectangle(x0, y0, x1, y1, left, bottom, right, top):
+    # Liang-Barsky clipping of the segments (x0, y0) -> (x1, y1), vectorized
+    dx = x1 - x0
+    dy = y1 - y0
+    t_in = np.zeros(len(x0))
+    t_out = np.ones(len(x0))
+    inside = np.ones(len(x0), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x0 - left), (dx, right - x0), (-dy, y0 - bottom), (dy, top - y0)):
+            inside &= ~((p == 0) & (q < 0))
+            ratio = q / p
+            t_in = np.where(p < 0, np.maximum(t_in, ratio), t_in)
+            t_out = np.where(p > 0, np.minimum(t_out, ratio), t_out)
+    return inside & (t_in <= t_out)
+
+
+class SpatialIndex:
+
+    def __init__(self, graph_index, cells_per_side=32):
+        self.graph_index = graph_index
+        node_positions = np.flatnonzero(graph_index.is_node)
+        self.grid = GridIndex(graph_index.x[node_positions], graph_index.y[node_positions], node_positions,
+                              cells_per_side)
+        self.radius = graph_index.node_size / 2
+        self.max_radius = float(self.radius.max()) if len(self.radius) else 0.0
+
+    def cells(self, extent):
+        # cells of the grid visible in a Cytoscape extent
+        return self.grid.cells(extent['x1'], extent['y1'], extent['x2'], extent['y2'])
+
+    def query(self, x1, y1, x2, y2, selection=None):
+        # boolean mask of the elements drawn in the rectangle : nodes whose disc meets it
+        # and edges crossing it, among the selected elements (all of them by default)
+        graph_index = self.graph_index
+        left, right = min(x1, x2), max(x1, x2)
+        bottom, top = min(y1, y2), max(y1, y2)
+        if selection is None:
+            selection = np.ones(len(graph_index), dtype=bool)
+
+        margin = self.max_radius
+        candidates = self.grid.cell_rows(self.grid.cells(left - margin, bottom - margin, right + margin, top + margin))
+        radius = self.radius[candidates]
+        hits = np.zeros(len(graph_index), dtype=bool)
+        hits[candidates] = (
+            (graph_index.x[candidates] + radius >= left) & (graph_index.x[candidates] - radius <= right)
+            & (graph_index.y[candidates] + radius >= bottom) & (graph_index.y[candidates] - radius <= top)
+        )
+        hits &= selection
+
+        edges = np.flatnonzero(~graph_index.is_node & selection)
+        edges = edges[selection[graph_index.source[edges]] & selection[graph_index.target[edges]]]
+        source = graph_index.source[edges]
+        target = graph_index.target[edges]
+        hits[edges] = segments_in_rectangle(
+            graph_index.x[source], graph_index.y[source], graph_index.x[target], graph_index.y[target],
+            left, bottom, right, top,
+        )
+        return hits
+
+    def query_extent(self, extent, selection=None):
+        return self.query(extent['x1'], extent['y1'], extent['x2'], extent['y2'], selection)
+
+    def node_ids(self, extent, selection=None):
+        hits = self.query_extent(extent, selection) & self.graph_index.is_node
+        return [self.graph_index.keys[position] for position in np.flatnonzero(hits)]
@@ -0,0 +1,225 @@
+#Stylesheet builder of the network graph : the stylesheet is composed of precomputed
+#fragments (base, tapped node, sector, publication and neighbourhood highlights), the
+#stylesheets being cached by front_end_app (sencodex/cache.py). Highlighted nodes
+#are given as explicit ids (sencodex/membership.py for sectors), never as prefix selectors
+#
+#assets/clientside.js mirrors this builder for the clientside callbacks, both are checked
+#against each other by tests/test_stylesheet_parity.py
+
+#Colors
+
+NODE_COLOR = "#07ABA0"
+LABEL_COLOR = "#008B80"
+EDGE_COLOR = "#C5D3E2"
+HIGHLIGHT_COLOR = "#920000"
+CITED_COLOR = "#ffdf4d"
+CITING_COLOR = "#b66dff"
+
+#Results of a citation query (sencodex/queries.py) : ancestors in yellow, descendants in purple
+#and a citation path in red
+
+QUERY_COLORS = {'ancestors': CITED_COLOR, 'descendants': CITING_COLOR, 'path': HIGHLIGHT_COLOR}
+
+#Base stylesheet of the network graph
+
+BASE_FRAGMENT = (
+    {
+        "selector": 'node',
+        'style': {
+            "opacity": 0.9,
+            "label": "data(label)",
+            "width": "data(node_size)",
+            "height": "data(node_size)",
+            "background-color": NODE_COLOR,
+            "color": LABEL_COLOR
+        }
+    },
+    {
+        "selector": 'edge',
+        "style": {
+            "target-arrow-color": EDGE_COLOR,
+            "target-arrow-shape": "triangle",
+            "line-color": EDGE_COLOR,
+            "background-color": NODE_COLOR,
+            'arrow-scale': 2,
+            'curve-style': 'bezier'
+        },
+    },
+)
+
+
+def node_selector(node_ids):
+    # a single rule for a group of nodes, instead of one rule per node
+    return ', '.join('node[id = "{}"]'.format(node_id) for node_id in node_ids)
+
+
+def size_fragment(size_rules):
+    # node sizes computed on the server, as (selector, size) pairs
+    return tuple(
+        {
+            "selector": selector,
+            "style": {
+                "width": size,
+                "height": size,
+            }
+        }
+        for selector, size in size_rules
+    )
+
+
+def tapped_fragment(node_id):
+    return (
+        {
+            "selector": node_selector([node_id]),
+            "style": {
+                'background-color': HIGHLIGHT_COLOR,
+                "border-color": HIGHLIGHT_COLOR,
+                "border-width": 2,
+                "border-opacity": 1,
+                "opacity": 1,
+                "label": "data(label)",
+                "color": HIGHLIGHT_COLOR,
+                "text-opacity": 1,
+                "font-size": 12,
+            }
+        },
+    )
+
+
+def sector_fragment(sector_ids):
+    return (
+        {
+            'selector': node_selector(sector_ids),
+            'style': {
+                'background-color': HIGHLIGHT_COLOR,
+            }
+        },
+    )
+
+
+def publication_fragment(publications):
+    return (
+        {
+            "selector": node_selector(publications),
+            "style": {
+                'background-color': HIGHLIGHT_COLOR,
+                "border-color": HIGHLIGHT_COLOR,
+                "border-width": 2,
+                "border-opacity": 1,
+                "opacity": 1,
+                "width": "200px",
+                "height": "200px",
+                "label": "data(label)",
+                "color": HIGHLIGHT_COLOR,
+                "text-opacity": 1,
+                "font-size": 12,
+            }
+        },
+    )
+
+
+def neighbor_fragment(node_id, cited_ids, citing_ids):
+    # publications quoted by the tapped node in yellow, publications quoting it in purple.
+    # Edges are matched on their source / target, whatever their number.
+    fragment = []
+    if cited_ids:
+        fragment.append({
+            "selector": node_selector(cited_ids),
+            "style": {
+                'background-color': CITED_COLOR,
+                'opacity': 0.9
+            }
+        })
+        fragment.append({
+            "selector": 'edge[source = "{}"]'.format(node_id),
+            "style": {
+                "mid-target-arrow-color": CITED_COLOR,
+                "mid-target-arrow-shape": "vee",
+                "line-color": CITED_COLOR,
+                'opacity': 0.9,
+            }
+        })
+    if citing_ids:
+        fragment.append({
+            "selector": node_selector(citing_ids),
+            "style": {
+                'background-color': CITING_COLOR,
+                'opacity': 0.9,
+            }
+        })
+        fragment.append({
+            "selector": 'edge[target = "{}"]'.format(node_id),
+            "style": {
+                "mid-target-arrow-color": CITING_COLOR,
+                "mid-target-arrow-shape": "vee",
+                "line-color": CITING_COLOR,
+                'opacity': 1,
+            }
+        })
+    return tuple(fragment)
+
+
+def query_fragment(mode, node_ids, edge_ids):
+    # publications found by a citation query, and the edges of a citation path
+    color = QUERY_COLORS[mode]
+    fragment = []
+    if node_ids:
+        fragment.append({
+            "selector": node_selector(node_ids),
+            "style": {
+                'background-color': color,
+                'opacity': 1,
+            }
+        })
+    if edge_ids:
+        fragment.append({
+            "selector": ', '.join('edge[id = "{}"]'.format(edge_id) for edge_id in edge_ids),
+            "style": {
+                "mid-target-arrow-color": color,
+                "mid-target-arrow-shape": "vee",
+                "line-color": color,
+                'width': 4,
+                'opacity': 1,
+            }
+        })
+    return tuple(fragment)
+
+
+def neighbors_from_edges(node_id, edges_data):
+    # ids quoted by and quoting node_id, from the edgesData of a tapNode event
+    cited_ids = set()
+    citing_ids = set()
+    for edge in edges_data:
+        if edge['source'] == node_id:
+            cited_ids.add(edge['target'])
+        if edge['target'] == node_id:
+            citing_ids.add(edge['source'])
+    return tuple(sorted(cited_ids)), tuple(sorted(citing_ids))
+
+
+def build_stylesheet(node_id=None, cited_ids=(), citing_ids=(), sector_ids=(), publications=(), size_rules=(),
+                     query=None):
+    # a tapped node takes precedence over the publication filter, as does the sector filter.
+    # query : (mode, node_ids, edge_ids) of a citation query from the publication filter
+    stylesheet = list(BASE_FRAGMENT)
+    stylesheet.extend(size_fragment(size_rules))
+    if node_id:
+        stylesheet.extend(tapped_fragment(node_id))
+        if sector_ids:
+            stylesheet.extend(sector_fragment(sector_ids))
+        stylesheet.extend(neighbor_fragment(node_id, cited_ids, citing_ids))
+    elif sector_ids:
+        stylesheet.extend(sector_fragment(sector_ids))
+    elif publications:
+        if query:
+            stylesheet.extend(query_fragment(*query))
+        stylesheet.extend(publication_fragment(publications))
+    return stylesheet
+
+
+def query_key(query):
+    # hashable form of a query result, as stored in the browser : [mode, node_ids, edge_ids]
+    if not query:
+        return None
+    mode, node_ids, edge_ids = query
+    return mode, tuple(node_ids), tuple(edge_ids)
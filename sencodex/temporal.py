@@ -0,0 +1,112 @@
+#Temporal citation analytics : the citations of the citation table dated by the publication
+#quoting, held as dense NumPy cubes (cited publication x year, and sector x document type x
+#year of the cited publication) with prefix sums over the years, so that the citations
+#received within any range of years are the difference of two slices, whatever the range.
+
+import numpy as np
+
+from sencodex import publication_year
+from sencodex.membership import matches_sector, sector_segments
+
+
+def prefix_sums(cube):
+    # cumulative sums over the last axis (the years), starting with 0
+    prefix = np.zeros(cube.shape[:-1] + (cube.shape[-1] + 1,))
+    np.cumsum(cube, axis=-1, out=prefix[..., 1:])
+    return prefix
+
+
+class TemporalCitations:
+
+    def __init__(self, ids, citing, cited, weights, years, sectors, type_docs):
+        # ids : publication ids, citing, cited, weights : deduplicated citations as codes of ids,
+        # years, sectors, type_docs : year (None if unknown), secteur and type_doc of each publication
+        self.ids = list(ids)
+        self.codes = {publication_id: code for code, publication_id in enumerate(self.ids)}
+        size = len(self.ids)
+        known = [year for year in years if year is not None]
+        self.first_year = min(known) if known else 0
+        self.last_year = max(known) if known else 0
+        year_count = self.last_year - self.first_year + 1
+        year_codes = np.array([-1 if year is None else year - self.first_year for year in years], dtype=np.int64)
+
+        citing = np.asarray(citing, dtype=np.int64)
+        cited = np.asarray(cited, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        # citations by a publication of unknown date are left out
+        dated = year_codes[citing] >= 0
+        cited, weights, citation_years = cited[dated], weights[dated], year_codes[citing[dated]]
+
+        # cited publication x year : citations, and publications quoting
+        cells = cited * year_count + citation_years
+        self.citations = prefix_sums(np.bincount(cells, weights, minlength=size * year_count).reshape(size, year_count))
+        self.quoting = prefix_sums(np.bincount(cells, minlength=size * year_count).reshape(size, year_count))
+
+        # sector x document type x year, over the sector fields as they are (a publication of
+        # several sectors is counted once), the empty field and None type last
+        self.sectors = sorted(set(sector for sector in sectors if sector))
+        self.type_docs = sorted(set(type_doc for type_doc in type_docs if type_doc))
+        sector_codes = {sector: code for code, sector in enumerate(self.sectors)}
+        type_codes = {type_doc: code for code, type_doc in enumerate(self.type_docs)}
+        publication_sectors = np.array([sector_codes.get(sector, len(self.sectors)) for sector in sectors], dtype=np.int64)
+        publication_types = np.array([type_codes.get(type_doc, len(self.type_docs)) for type_doc in type_docs],
+                                     dtype=np.int64)
+        shape = (len(self.sectors) + 1, len(self.type_docs) + 1, year_count)
+        groups = (publication_sectors[cited] * shape[1] + publication_types[cited]) * year_count + citation_years
+        self.groups = prefix_sums(np.bincount(groups, weights, minlength=int(np.prod(shape))).reshape(shape))
+        self.sector_segments = [sector_segments(sector) for sector in self.sectors]
+
+    @classmethod
+    def from_analytics(cls, analytics, graph_index):
+        # citations of the citation analytics (sencodex/analytics.py), dates and categories of the graph
+        citations = analytics.matrix.tocoo()
+        years, sectors, type_docs = [], [], []
+        for publication_id in analytics.ids:
+            element = graph_index.get(publication_id)
+            data = element['data'] if element is not None else {}
+            # year of the publication date, of the id when it has none
+            years.append(int(data['datetime'][:4]) if data.get('datetime') else publication_year(publication_id))
+            sectors.append(data.get('secteur'))
+            type_docs.append(data.get('type_doc'))
+        return cls(analytics.ids, citations.row, citations.col, citations.data, years, sectors, type_docs)
+
+    def _years(self, start, end):
+        # columns of the prefix sums of the years start to end, clipped to the known years
+        start = min(max(start, self.first_year), self.last_year + 1)
+        end = min(max(end, self.first_year - 1), self.last_year)
+        return start - self.first_year, max(end - self.first_year + 1, start - self.first_year)
+
+    def received(self, start, end, quoting=False):
+        # citations received by every publication from publications of the years start to end
+        # (or number of publications quoting them), over the ids
+        first, last = self._years(start, end)
+        prefix = self.quoting if quoting else self.citations
+        return prefix[:, last] - prefix[:, first]
+
+    def series(self, publication_id, start=None, end=None):
+        # (years, citations received each year) of a publication, over the known years by default
+        start = self.first_year if start is None else start
+        end = self.last_year if end is None else end
+        years = np.arange(start, end + 1)
+        code = self.codes.get(publication_id)
+        if code is None:
+            return years, np.zeros(len(years))
+        first, last = self._years(start, end)
+        values = np.zeros(len(years))
+        offset = max(self.first_year - start, 0)
+        values[offset:offset + last - first] = np.diff(self.citations[code, first:last + 1])
+        return years, values
+
+    def group_received(self, start, end, sectors=(), type_docs=()):
+        # citations received from the years start to end by the publications of any of the sectors
+        # (dropdown values, sencodex/membership.py) and of any of the document types, all when empty
+        first, last = self._years(start, end)
+        totals = self.groups[:, :, last] - self.groups[:, :, first]
+        if sectors:
+            rows = [code for code, segments in enumerate(self.sector_segments)
+                    if any(matches_sector(segments, sector) for sector in sectors)]
+            totals = totals[rows]
+        if type_docs:
+            columns = [self.type_docs.index(type_doc) for type_doc in type_docs if type_doc in self.type_docs]
+            totals = totals[:, columns]
+        return float(totals.sum())
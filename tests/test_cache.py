@@ -0,0 +1,52 @@
+#Values of the shared caches go through the codec of their namespace (sencodex/cache.py)
+
+import os
+
+import numpy as np
+import pytest
+
+from sencodex.cache import BYTES, JSON, make_cache
+from sencodex.data import get_graph_index
+from sencodex.responses import RANGE_CODEC, RangeResponse
+
+
+def test_range_codec_round_trip():
+    graph_index = get_graph_index()
+    for start, end in [(9, 21), (12, 15), (21, 21)]:
+        response = RangeResponse.build(graph_index, np.flatnonzero(graph_index.range_selection(start, end)))
+        loaded = RANGE_CODEC.loads(RANGE_CODEC.dumps(response))
+        assert loaded.positions.dtype == np.int32
+        assert (loaded.positions == response.positions).all()
+        assert loaded.payload == response.payload
+        assert loaded.encoded == response.encoded
+
+
+def test_range_codec_empty_response():
+    response = RangeResponse(np.zeros(0, dtype=np.int32), b'[]')
+    loaded = RANGE_CODEC.loads(RANGE_CODEC.dumps(response))
+    assert len(loaded.positions) == 0 and loaded.payload == b'[]' and loaded.encoded == {}
+
+
+def test_range_codec_truncated():
+    data = RANGE_CODEC.dumps(RangeResponse(np.arange(4, dtype=np.int32), b'[1,2,3,4]', {'gzip': b'x'}))
+    for length in (0, 3, len(data) - 1):
+        with pytest.raises(ValueError):
+            RANGE_CODEC.loads(data[:length])
+
+
+@pytest.mark.parametrize('codec, value', [(BYTES, b'workbook'), (JSON, [{'selector': 'node', 'style': {'z': 1}}])])
+def test_disk_cache(tmp_path, codec, value):
+    cache = make_cache('disk', 'test', 'version', directory=str(tmp_path), codec=codec)
+    cache.set(('key', 1), value)
+    cache.local.clear()
+    assert cache.get(('key', 1)) == value
+    directory = tmp_path / 'sen-codex-cache'
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def test_disk_cache_refuses_shared_directory(tmp_path):
+    directory = tmp_path / 'sen-codex-cache'
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    with pytest.raises(RuntimeError):
+        make_cache('disk', 'test', 'version', directory=str(tmp_path))
@@ -0,0 +1,53 @@
+#The patches of sencodex/diffs.py, applied as the browser applies them, must give the new selection
+
+import random
+
+import numpy as np
+
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.data import get_graph_index
+from sencodex.diffs import selection_patch
+
+
+def apply_operations(elements, operations):
+    # the Delete and Insert operations of a Dash Patch on a list
+    elements = list(elements)
+    for operation in operations:
+        if operation['operation'] == 'Delete':
+            del elements[operation['location'][0]]
+        elif operation['operation'] == 'Insert':
+            elements.insert(operation['params']['index'], operation['params']['value'])
+        else:
+            raise AssertionError(f"unexpected operation {operation['operation']}")
+    return elements
+
+
+def check_transition(elements, previous, selection):
+    patch = selection_patch(elements, previous, selection, max_operations=len(elements))
+    result = apply_operations([elements[index] for index in np.flatnonzero(previous)],
+                              patch.to_plotly_json()['operations'])
+    assert result == [elements[index] for index in np.flatnonzero(selection)]
+
+
+def test_random_masks():
+    rng = np.random.default_rng(0)
+    elements = [{'data': {'id': str(index)}} for index in range(60)]
+    for _ in range(200):
+        previous = rng.random(len(elements)) < rng.random()
+        selection = rng.random(len(elements)) < rng.random()
+        check_transition(elements, previous, selection)
+
+
+def test_range_transitions():
+    graph_index = get_graph_index()
+    ranges = [(start, end) for start in range(FIRST_YEAR, LAST_YEAR + 1) for end in range(start, LAST_YEAR + 1)]
+    transitions = random.Random(0).sample([(a, b) for a in ranges for b in ranges], 40)
+    for (start, end), (new_start, new_end) in transitions:
+        check_transition(graph_index.elements, graph_index.range_selection(start, end),
+                         graph_index.range_selection(new_start, new_end))
+
+
+def test_too_many_operations():
+    elements = [{'data': {'id': str(index)}} for index in range(10)]
+    previous = np.zeros(10, dtype=bool)
+    assert selection_patch(elements, previous, ~previous, max_operations=5) is None
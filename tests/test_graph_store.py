@@ -0,0 +1,52 @@
+#The graph store and the elements materialized from its columns (sencodex/graph_model.py) must
+#give the elements of the published .dat snapshots, up to the conversion of the store : a missing
+#sector is None rather than NaN, and edges get a stable id
+
+import numpy as np
+import pytest
+
+from sencodex import FIRST_YEAR, LAST_YEAR
+from sencodex.graph_index import GraphIndex
+from sencodex.graph_store import GraphStore, edge_id
+from sencodex.pipeline import node_data
+from sencodex.responses import serialize
+
+RANGES = [(FIRST_YEAR, LAST_YEAR), (FIRST_YEAR, FIRST_YEAR), (12, 15), (LAST_YEAR, LAST_YEAR)]
+
+
+def converted(element):
+    # a snapshot element as converted by the store
+    data = element['data']
+    if 'source' in data:
+        return {'data': {'id': edge_id(data['source'], data['target']), **data}}
+    return {'data': node_data(element), 'position': {'x': float(element['position']['x']),
+                                                     'y': float(element['position']['y'])}}
+
+
+@pytest.fixture(scope='module')
+def snapshots():
+    return GraphIndex.from_dat_files()
+
+
+@pytest.fixture(scope='module')
+def store_index():
+    return GraphIndex.from_store(GraphStore())
+
+
+def test_same_elements(snapshots, store_index):
+    assert store_index.keys == snapshots.keys
+    assert (store_index.masks == snapshots.masks).all()
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_range_payloads(snapshots, store_index, start, end):
+    expected = [converted(snapshots.elements[position])
+                for position in np.flatnonzero(snapshots.range_selection(start, end))]
+    elements = [store_index.elements[position] for position in np.flatnonzero(store_index.range_selection(start, end))]
+    assert elements == expected
+    assert serialize(elements) == serialize(expected)
+
+
+def test_store_nodes(store_index):
+    nodes = GraphStore().node_elements()
+    assert nodes == [store_index.elements[position] for position in range(len(nodes))]
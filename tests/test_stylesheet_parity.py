@@ -0,0 +1,99 @@
+#The stylesheets of the clientside callback (assets/clientside.js, run with node) and of its
+#server fallback (front_end_app.generate_stylesheet) must stay identical, from the same
+#callback inputs : taps on drawn nodes with the data of their drawn edges, sector highlights,
+#publication filters, size rules and citation queries
+
+from collections import defaultdict
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+CLIENTSIDE_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'clientside.js')
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason="the clientside callbacks run with node")
+
+
+def clientside_stylesheets(cases):
+    # dash_clientside.stylesheet.generate on the arguments of each case
+    script = (
+        "require(process.argv[1]); const generate = globalThis.dash_clientside.stylesheet.generate;"
+        "let input = ''; process.stdin.on('data', chunk => input += chunk);"
+        "process.stdin.on('end', () => process.stdout.write(JSON.stringify("
+        "JSON.parse(input).map(args => generate(...args)))));"
+    )
+    result = subprocess.run(
+        ['node', '-e', script, CLIENTSIDE_JS], input=json.dumps(cases), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def taps(elements, count):
+    # tapNode of the most connected drawn nodes : their data and the data of their drawn edges
+    edges = defaultdict(list)
+    for element in elements:
+        if 'source' in element['data']:
+            edges[element['data']['source']].append(element['data'])
+            edges[element['data']['target']].append(element['data'])
+    nodes = [element for element in elements if 'source' not in element['data']]
+    nodes.sort(key=lambda element: (-len(edges[element['data']['id']]), element['data']['id']))
+    return [{'data': element['data'], 'edgesData': edges[element['data']['id']]} for element in nodes[:count]]
+
+
+@pytest.fixture(scope='module')
+def cases():
+    from sencodex import FIRST_YEAR, LAST_YEAR
+    from sencodex.analytics import size_rules
+    from sencodex.data import (
+        get_citation_analytics, get_citation_queries, get_membership, get_publication_options, get_range_metrics,
+        get_range_responses
+    )
+    from sencodex.graph_store import edge_id
+    from sencodex.queries import path_edges
+
+    membership = get_membership()
+    sectors = [
+        list(membership.node_ids_for(sectors, type_docs, 12, 15))
+        for sectors, type_docs in [(['Agriculture'], []), (['BTP', 'Energie'], []), (['Numérique'], ['Avis']),
+                                   (['Santé', 'Télécoms', 'consommation'], ['Avis', 'Décision'])]
+    ]
+    options = get_publication_options()
+    # a single value, as persisted by the former single dropdowns, and lists
+    publications = options[:8] + [[publication] for publication in options[8:16]] + [options[16:20], options[20:23]]
+    metrics = get_range_metrics(12, 15)
+    rules = [list(rule) for rule in size_rules(get_citation_analytics().ids, metrics['pagerank'], metrics['nodes'])]
+    citation_queries = get_citation_queries()
+    path = citation_queries.shortest_path('21-D-30', '09-D-06')
+    queries = [
+        ['ancestors', list(citation_queries.ancestors('21-D-30', 2)), []],
+        ['descendants', list(citation_queries.descendants('09-D-06', 1)), []],
+        ['path', list(path), [edge_id(*edge) for edge in path_edges(path)]],
+    ]
+
+    cases = [[None, [], None, [], None]]
+    for start, end in [(FIRST_YEAR, LAST_YEAR), (12, 15), (LAST_YEAR, LAST_YEAR)]:
+        for index, tap in enumerate(taps(get_range_responses().elements(start, end), 25)):
+            cases.append([tap, [], None, [], None])
+            cases.append([tap, sectors[index % len(sectors)], publications[index % len(publications)], rules,
+                          queries[index % len(queries)]])
+    cases.extend([None, sector_ids, None, [], None] for sector_ids in sectors)
+    cases.extend([None, [], publication_ids, rules, None] for publication_ids in publications)
+    cases.extend([None, [], publications[-1], [], query] for query in queries)
+    return cases
+
+
+def test_taps_have_drawn_edges(cases):
+    assert sum(1 for case in cases if case[0] and case[0]['edgesData']) > 50
+
+
+def test_clientside_stylesheets_match(cases):
+    from front_end_app import generate_stylesheet
+
+    mismatches = [
+        case[0]['data']['id'] if case[0] else case[1:3]
+        for case, clientside in zip(cases, clientside_stylesheets(cases))
+        if json.loads(json.dumps(generate_stylesheet(*case))) != clientside
+    ]
+    assert mismatches == []